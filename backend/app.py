@@ -3,11 +3,21 @@ Flask Backend for LINGO Visualization
 Serves task data, similarities, and model results via REST API.
 """
 
+import cProfile
+import functools
+import io
 import json
 import os
 import math
+import pstats
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import lru_cache
 import numpy as np
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, has_request_context, jsonify, request, send_from_directory
 from flask_cors import CORS
 
 # Setup Flask
@@ -18,14 +28,37 @@ CORS(app)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(BASE_DIR)
 PROCESSED_DIR = os.path.join(PROJECT_ROOT, "processed")
+
+# Embedding storage format written by scripts/quantize_embeddings.py
+# ("float32", "float16" or "int8"); falls back to float32 if the file is missing
+EMBEDDING_FORMAT = os.environ.get('LINGO_EMBEDDING_FORMAT', 'int8')
+EMBEDDING_FILES = {
+    'float32': 'embeddings.npy',
+    'float16': 'embeddings_f16.npy',
+    'int8': 'embeddings_int8.npz',
+}
 FRONTEND_DIR = os.path.join(PROJECT_ROOT, "frontend")
 
 # Data storage
 tasks_data = []
+task_index = {}
 embeddings = None
+embedding_norms = None
 similarities = []
 model_results = []
 
+# Instances of the final split dataset (scripts/create_final_data.py), read on demand:
+# path of instances.jsonl (one instance per line), byte offset per instance line,
+# instance-row range per task row, and task id -> task row
+instance_store = {}
+
+# Fields returned by task endpoints when no ?fields= projection is given.
+# Instances are left out: they dominate payload size and only a few views need them.
+DEFAULT_TASK_FIELDS = (
+    'id', 'task_name', 'category', 'source_dataset', 'domain', 'input_language',
+    'x', 'y', 'z', 'definition', 'positive_examples', 'negative_examples', 'num_instances'
+)
+
 
 class NpEncoder(json.JSONEncoder):
     """Custom encoder for NumPy data types"""
@@ -57,15 +90,112 @@ def sanitize_obj(obj):
     return obj
 
 
+def parse_fields(raw):
+    """
+    Parse a field projection from a comma-separated string or a list.
+    Returns None for "all fields" ('*'), DEFAULT_TASK_FIELDS when nothing is given.
+    """
+    if raw is None or raw == '' or raw == []:
+        return DEFAULT_TASK_FIELDS
+    if isinstance(raw, str):
+        raw = raw.split(',')
+    fields = tuple(f.strip() for f in raw if f and f.strip())
+    if '*' in fields:
+        return None
+    return fields or DEFAULT_TASK_FIELDS
+
+
+def project_task(task, fields):
+    """Build a new dict holding only the requested fields (no full-task copy)"""
+    if fields is None:
+        record = dict(task)
+    else:
+        record = {f: task[f] for f in fields if f in task}
+    if (fields is None or 'instances' in fields) and 'instances' not in task and instance_store:
+        record['instances'] = task_instances(task)
+    return record
+
+
+def iter_task_instances(task, start=0, stop=None):
+    """
+    Yield a task's instances start..stop, inline if loaded from tasks_basic.json,
+    else read line by line from instances.jsonl (only the requested lines).
+    """
+    if 'instances' in task:
+        yield from task['instances'][start:stop]
+        return
+    for line in _iter_stored_instance_lines(task, start, stop):
+        yield json.loads(line)
+
+
+def iter_task_instance_lines(task, start=0, stop=None):
+    """
+    Yield a task's instances start..stop as NDJSON lines. Stored lines are
+    already compact JSON and pass through as bytes without being parsed.
+    """
+    if 'instances' in task:
+        for inst in task['instances'][start:stop]:
+            yield json.dumps(sanitize_obj(inst), cls=NpEncoder) + '\n'
+        return
+    yield from _iter_stored_instance_lines(task, start, stop)
+
+
+def _iter_stored_instance_lines(task, start, stop):
+    row = instance_store.get('rows', {}).get(task.get('id'))
+    if row is None:
+        return
+    ptr = instance_store['task_ptr']
+    first, last = int(ptr[row]), int(ptr[row + 1])
+    stop = last if stop is None else min(last, first + stop)
+    first += start
+    if first >= stop:
+        return
+    with open(instance_store['path'], 'rb') as f:
+        f.seek(int(instance_store['offsets'][first]))
+        for _ in range(first, stop):
+            yield f.readline()
+
+
+def task_instances(task):
+    """All of a task's instances as a list"""
+    return list(iter_task_instances(task))
+
+
+def ndjson_response(rows):
+    """
+    Stream an iterable of dicts as newline-delimited JSON.
+    Rows are serialized one at a time, so memory does not grow with payload size.
+    """
+    def generate():
+        for row in rows:
+            yield json.dumps(sanitize_obj(row), cls=NpEncoder) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
 def load_data():
     """Load all data files on startup"""
-    global tasks_data, embeddings, similarities, model_results
+    global tasks_data, task_index, embeddings, embedding_norms, similarities, model_results, instance_store
     
     print(f"Loading data from: {PROCESSED_DIR}")
     
-    # 1. Load Tasks
+    # 1. Load Tasks (final split dataset if built: coords already joined, instances on disk)
+    final_dir = os.path.join(PROCESSED_DIR, "final")
+    final_tasks_path = os.path.join(final_dir, "tasks.json")
     tasks_path = os.path.join(PROCESSED_DIR, "tasks_basic.json")
-    if os.path.exists(tasks_path):
+    instance_store = {}
+    if os.path.exists(final_tasks_path):
+        with open(final_tasks_path, 'r', encoding='utf-8') as f:
+            tasks_data = json.load(f)
+        instance_store = {
+            'path': os.path.join(final_dir, "instances.jsonl"),
+            'offsets': np.load(os.path.join(final_dir, "instance_offsets.npy"), mmap_mode='r'),
+            'task_ptr': np.load(os.path.join(final_dir, "task_instance_ptr.npy")),
+            'rows': dict(zip((t.get('id') for t in tasks_data), range(len(tasks_data))))
+        }
+        print(f" - Loaded {len(tasks_data)} tasks (final table, {instance_store['task_ptr'][-1]} instances "
+              f"on disk, {instance_store['offsets'][-1] / 1e6:.1f} MB)")
+    elif os.path.exists(tasks_path):
         with open(tasks_path, 'r', encoding='utf-8') as f:
             tasks_data = json.load(f)
         print(f" - Loaded {len(tasks_data)} tasks")
@@ -73,28 +203,42 @@ def load_data():
         print("WARNING: tasks_basic.json not found")
         tasks_data = []
     
-    # 2. Load and merge 3D coordinates
+    # 2. Load and merge 3D coordinates (the final table already has them)
     coords_path = os.path.join(PROCESSED_DIR, "coords_3d.npy")
-    if os.path.exists(coords_path):
-        coords = np.load(coords_path)
-        print(f" - Loaded 3D coords: {coords.shape}")
-        for i, task in enumerate(tasks_data):
-            if i < len(coords):
-                task['x'] = float(coords[i, 0])
-                task['y'] = float(coords[i, 1])
-                task['z'] = float(coords[i, 2])
-    else:
-        print("WARNING: coords_3d.npy not found")
+    if not instance_store:
+        if os.path.exists(coords_path):
+            coords = np.load(coords_path)
+            print(f" - Loaded 3D coords: {coords.shape}")
+            for i, task in enumerate(tasks_data):
+                if i < len(coords):
+                    task['x'] = float(coords[i, 0])
+                    task['y'] = float(coords[i, 1])
+                    task['z'] = float(coords[i, 2])
+        else:
+            print("WARNING: coords_3d.npy not found")
     
-    # 3. Load embeddings
-    emb_path = os.path.join(PROCESSED_DIR, "embeddings.npy")
+    task_index = {t.get('id'): t for t in tasks_data}
+    
+    # 3. Load embeddings (kept in their stored dtype; int8 scales are not needed for cosine)
+    emb_format = EMBEDDING_FORMAT
+    emb_path = os.path.join(PROCESSED_DIR, EMBEDDING_FILES[emb_format])
+    if not os.path.exists(emb_path):
+        emb_format = 'float32'
+        emb_path = os.path.join(PROCESSED_DIR, EMBEDDING_FILES[emb_format])
     if os.path.exists(emb_path):
-        embeddings = np.load(emb_path)
-        print(f" - Loaded embeddings: {embeddings.shape}")
+        if emb_format == 'int8':
+            with np.load(emb_path) as data:
+                embeddings = data['q']
+        else:
+            embeddings = np.load(emb_path)
+        embedding_norms = np.sqrt(np.einsum('ij,ij->i', embeddings, embeddings, dtype=np.float32))
+        embedding_norms[embedding_norms == 0] = 1
+        print(f" - Loaded {emb_format} embeddings: {embeddings.shape} ({embeddings.nbytes / 1e6:.1f} MB)")
     
-    # 4. Load similarities
+    # 4. Load similarities (CSR neighbor graph if built, else the JSON lists)
+    load_neighbor_graph()
     sim_path = os.path.join(PROCESSED_DIR, "similarities.json")
-    if os.path.exists(sim_path):
+    if not neighbor_graph and os.path.exists(sim_path):
         with open(sim_path, 'r', encoding='utf-8') as f:
             similarities = json.load(f)
         print(f" - Loaded similarities for {len(similarities)} tasks")
@@ -105,6 +249,109 @@ def load_data():
         with open(results_path, 'r', encoding='utf-8') as f:
             model_results = json.load(f)
         print(f" - Loaded model results for {len(model_results)} tasks")
+    
+    build_results_store()
+    
+    # 6. Load per-instance token index (memory-mapped)
+    load_token_index()
+    
+    # 7. Load near-duplicate clusters and leakage scores
+    load_near_duplicates()
+    
+    # 8. Load precomputed category / source / domain views
+    load_group_views()
+
+
+# ============================================
+# Admission Control
+# ============================================
+
+# Heavy endpoints run on a bounded pool. Work beyond HEAVY_WORKERS running +
+# HEAVY_QUEUE waiting is rejected with 503, and identical in-flight requests
+# share one computation (single-flight).
+HEAVY_WORKERS = int(os.environ.get('LINGO_HEAVY_WORKERS', '4'))
+HEAVY_QUEUE = int(os.environ.get('LINGO_HEAVY_QUEUE', '16'))
+HEAVY_TIMEOUT = float(os.environ.get('LINGO_HEAVY_TIMEOUT', '30'))
+MAX_TASK_IDS = int(os.environ.get('LINGO_MAX_TASK_IDS', '500'))
+# Task ids are hashed as 64-bit integers (simulated results), anything wider is rejected
+TASK_ID_MIN, TASK_ID_MAX = -(1 << 63), (1 << 63) - 1
+
+_heavy_executor = ThreadPoolExecutor(max_workers=HEAVY_WORKERS, thread_name_prefix='heavy')
+_heavy_slots = threading.BoundedSemaphore(HEAVY_WORKERS + HEAVY_QUEUE)
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class Overloaded(Exception):
+    """Raised when the heavy-endpoint queue is full or a computation times out"""
+
+
+def run_heavy(key, fn):
+    """
+    Run fn() on the heavy pool, or join an identical in-flight call with the same key.
+    fn must not touch the request context (it runs on a worker thread).
+    If the request is being profiled (see profiled_view), fn is profiled on the worker
+    and that profile is attached to the request's dump.
+    """
+    profiler = g.get('profiler') if has_request_context() else None
+    worker_profilers = []
+    paused = False
+    
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is None:
+            if not _heavy_slots.acquire(blocking=False):
+                raise Overloaded('Server busy, retry shortly')
+            
+            def task():
+                try:
+                    if profiler is None:
+                        return fn()
+                    worker_profiler = cProfile.Profile()
+                    worker_profilers.append(worker_profiler)
+                    return worker_profiler.runcall(fn)
+                finally:
+                    with _inflight_lock:
+                        _inflight.pop(key, None)
+                    _heavy_slots.release()
+            
+            # The request thread only waits on the worker; keep that wait out of the profile
+            if profiler is not None:
+                profiler.disable()
+                paused = True
+            future = _heavy_executor.submit(task)
+            _inflight[key] = future
+    
+    try:
+        return future.result(timeout=HEAVY_TIMEOUT)
+    except FutureTimeout:
+        raise Overloaded('Request timed out in queue')
+    finally:
+        if paused:
+            g.worker_profilers = g.get('worker_profilers', []) + worker_profilers
+            profiler.enable()
+
+
+def read_task_ids(data, required=True):
+    """
+    Validate a task_ids list from a JSON body.
+    Returns (task_ids, None) or (None, error response).
+    """
+    task_ids = (data or {}).get('task_ids')
+    if task_ids is None and not required:
+        return None, None
+    if not isinstance(task_ids, list) or not all(isinstance(t, int) and not isinstance(t, bool) for t in task_ids):
+        return None, (jsonify({'error': 'task_ids must be a list of integers'}), 400)
+    if len(task_ids) > MAX_TASK_IDS:
+        return None, (jsonify({'error': f'Too many task_ids ({len(task_ids)} > {MAX_TASK_IDS})'}), 413)
+    if not all(TASK_ID_MIN <= t <= TASK_ID_MAX for t in task_ids):
+        return None, (jsonify({'error': 'task_ids must fit in a signed 64-bit integer'}), 400)
+    return task_ids, None
+
+
+@app.errorhandler(Overloaded)
+def handle_overloaded(e):
+    return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
 
 
 # ============================================
@@ -129,32 +376,105 @@ def get_tasks():
     Get all tasks (lightweight - excludes instances for performance).
     Returns: id, task_name, category, source_dataset, domain, x, y, z, definition
     """
-    summary = []
-    for t in tasks_data:
-        summary.append({
-            'id': t.get('id'),
-            'task_name': t.get('task_name'),
-            'category': t.get('category'),
-            'source_dataset': t.get('source_dataset'),
-            'domain': t.get('domain', t.get('category')),
-            'x': t.get('x', 0.0),
-            'y': t.get('y', 0.0),
-            'z': t.get('z', 0.0),
-            'definition': t.get('definition', '')[:300]
-        })
+    summary = [task_summary(t) for t in tasks_data]
     
     return json.dumps(sanitize_obj(summary), cls=NpEncoder), 200, {'Content-Type': 'application/json'}
 
 
+@app.route('/api/tasks_stream', methods=['GET'])
+def get_tasks_stream():
+    """
+    Stream all tasks as NDJSON, one task per line.
+    Query params:
+      - fields: comma-separated task fields (default: the /api/tasks summary)
+    """
+    if request.args.get('fields'):
+        fields = parse_fields(request.args.get('fields'))
+        rows = (project_task(t, fields) for t in tasks_data)
+    else:
+        rows = (task_summary(t) for t in tasks_data)
+    
+    return ndjson_response(rows)
+
+
+def task_summary(t):
+    """Lightweight task record used by the overview (no examples or instances)"""
+    return {
+        'id': t.get('id'),
+        'task_name': t.get('task_name'),
+        'category': t.get('category'),
+        'source_dataset': t.get('source_dataset'),
+        'domain': t.get('domain', t.get('category')),
+        'x': t.get('x', 0.0),
+        'y': t.get('y', 0.0),
+        'z': t.get('z', 0.0),
+        'definition': t.get('definition', '')[:300]
+    }
+
+
 @app.route('/api/task/<int:task_id>', methods=['GET'])
 def get_task_detail(task_id):
-    """Get full details for a single task including examples and instances"""
-    task = next((t for t in tasks_data if t.get('id') == task_id), None)
+    """
+    Get details for a single task.
+    Query params:
+      - fields: comma-separated fields to return (default: all except instances, '*' for everything)
+    """
+    task = task_index.get(task_id)
+    
+    if not task:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    fields = parse_fields(request.args.get('fields'))
+    result = project_task(task, fields)
+    
+    return json.dumps(sanitize_obj(result), cls=NpEncoder), 200, {'Content-Type': 'application/json'}
+
+
+@app.route('/api/task/<int:task_id>/instances_stream', methods=['GET'])
+def get_task_instances_stream(task_id):
+    """
+    Stream a task's instances as NDJSON, one instance per line.
+    Query params:
+      - offset: first instance to send (default 0)
+      - limit: maximum number of instances (default all)
+    """
+    task = task_index.get(task_id)
     
     if not task:
         return jsonify({'error': 'Task not found'}), 404
     
-    return json.dumps(sanitize_obj(task), cls=NpEncoder), 200, {'Content-Type': 'application/json'}
+    offset = max(0, request.args.get('offset', default=0, type=int))
+    limit = request.args.get('limit', default=None, type=int)
+    stop = None if limit is None else offset + max(0, limit)
+    
+    # Stored instance lines are sent as read from disk, one at a time
+    return Response(iter_task_instance_lines(task, offset, stop), mimetype='application/x-ndjson')
+
+
+@app.route('/api/tasks_batch', methods=['POST'])
+def get_tasks_batch():
+    """
+    Get details for several tasks in one request.
+    Body: {"task_ids": [...], "fields": [...] or "a,b,c"}
+    Unknown ids are skipped; order follows task_ids (at most MAX_TASK_IDS of them).
+    """
+    data = request.get_json(silent=True) or {}
+    task_ids, error = read_task_ids(data)
+    if error:
+        return error
+    raw_fields = data.get('fields', request.args.get('fields'))
+    if raw_fields is not None and not isinstance(raw_fields, str) and \
+            not (isinstance(raw_fields, list) and all(isinstance(f, str) for f in raw_fields)):
+        return jsonify({'error': 'fields must be a string or a list of strings'}), 400
+    fields = parse_fields(raw_fields)
+    
+    results = []
+    for tid in task_ids:
+        task = task_index.get(tid)
+        if task:
+            results.append(project_task(task, fields))
+    
+    return json.dumps(sanitize_obj(results), cls=NpEncoder), 200, {'Content-Type': 'application/json'}
 
 
 @app.route('/api/similar/<int:task_id>', methods=['GET'])
@@ -164,12 +484,15 @@ def get_similar_tasks(task_id):
     Query params:
       - k: number of similar tasks (default 9)
       - threshold: minimum similarity (default 0)
+      - fields: comma-separated task fields to return (default: all except instances)
     """
     k = request.args.get('k', default=9, type=int)
     threshold = request.args.get('threshold', default=0.0, type=float)
+    fields = parse_fields(request.args.get('fields'))
     
     # Find similarity record for this task
-    sim_record = next((s for s in similarities if s.get('task_id') == task_id), None)
+    sim_record = graph_similarity_record(task_id) if neighbor_graph else \
+        next((s for s in similarities if s.get('task_id') == task_id), None)
     
     if not sim_record:
         return jsonify({
@@ -177,8 +500,10 @@ def get_similar_tasks(task_id):
             'similar_tasks': []
         })
     
-    # Get root task (full data)
-    root_task = next((t for t in tasks_data if t.get('id') == task_id), None)
+    # Get root task
+    root_task = task_index.get(task_id)
+    if root_task:
+        root_task = project_task(root_task, fields)
     
     # Filter and get top k similar tasks
     neighbors = []
@@ -188,14 +513,14 @@ def get_similar_tasks(task_id):
         if len(neighbors) >= k:
             break
     
-    # Hydrate neighbor data (include full task info)
+    # Hydrate neighbor data (projected fields only)
     hydrated = []
     for n in neighbors:
-        task = next((t for t in tasks_data if t.get('id') == n['id']), None)
+        task = task_index.get(n['id'])
         if task:
-            task_copy = task.copy()
-            task_copy['similarity'] = n['similarity']
-            hydrated.append(task_copy)
+            task_view = project_task(task, fields)
+            task_view['similarity'] = n['similarity']
+            hydrated.append(task_view)
     
     result = {
         'root_task': root_task,
@@ -211,31 +536,30 @@ def get_pairwise_similarity():
     Compute pairwise similarities between a list of task IDs.
     Used for inter-task links in Panel B.
     """
-    data = request.get_json()
-    task_ids = data.get('task_ids', [])
+    task_ids, error = read_task_ids(request.get_json(silent=True))
+    if error:
+        return error
     
     if embeddings is None or len(task_ids) < 2:
         return jsonify({'task_ids': task_ids, 'matrix': []})
     
+    payload = run_heavy(('pairwise_similarity', tuple(task_ids)), lambda: pairwise_similarity_payload(task_ids))
+    return payload, 200, {'Content-Type': 'application/json'}
+
+
+def pairwise_similarity_payload(task_ids):
+    """Cosine similarity matrix between the given tasks, serialized"""
     # Get embeddings for these tasks
-    emb_list = []
-    valid_ids = []
-    
-    for tid in task_ids:
-        if tid < len(embeddings):
-            emb_list.append(embeddings[tid])
-            valid_ids.append(tid)
+    valid_ids = [tid for tid in task_ids if 0 <= tid < len(embeddings)]
     
-    if len(emb_list) < 2:
-        return jsonify({'task_ids': valid_ids, 'matrix': []})
+    if len(valid_ids) < 2:
+        return json.dumps({'task_ids': valid_ids, 'matrix': []})
     
-    # Compute pairwise cosine similarities
-    emb_array = np.array(emb_list)
+    # Compute pairwise cosine similarities (only the selected rows are upcast)
+    emb_array = embeddings[valid_ids].astype(np.float32)
     
     # Normalize embeddings
-    norms = np.linalg.norm(emb_array, axis=1, keepdims=True)
-    norms[norms == 0] = 1
-    normalized = emb_array / norms
+    normalized = emb_array / embedding_norms[valid_ids, None]
     
     # Compute similarity matrix
     sim_matrix = np.dot(normalized, normalized.T)
@@ -245,17 +569,426 @@ def get_pairwise_similarity():
         'matrix': sim_matrix.tolist()
     }
     
+    return json.dumps(sanitize_obj(result), cls=NpEncoder)
+
+
+# ============================================
+# Neighbor Graph
+# ============================================
+
+GRAPH_DIR = os.path.join(PROCESSED_DIR, "neighbor_graph")
+
+# CSR arrays written by scripts/compute_similarities.py (memory-mapped)
+neighbor_graph = {}
+graph_row = {}
+
+
+def load_neighbor_graph():
+    """Memory-map the top-k neighbor graph if the pipeline has built it"""
+    global neighbor_graph, graph_row
+    
+    neighbor_graph, graph_row = {}, {}
+    graph_components.cache_clear()
+    
+    if not os.path.isdir(GRAPH_DIR):
+        return
+    
+    for name in ('indptr', 'neighbors', 'weights', 'task_ids'):
+        neighbor_graph[name] = np.load(os.path.join(GRAPH_DIR, f'{name}.npy'), mmap_mode='r')
+    graph_row = dict(zip(neighbor_graph['task_ids'].tolist(), range(len(neighbor_graph['task_ids']))))
+    
+    print(f" - Loaded neighbor graph: {len(graph_row)} tasks, {len(neighbor_graph['neighbors'])} edges")
+
+
+def graph_adjacency(rows):
+    """All out-edges of the given rows as (source rows, target rows, weights)"""
+    indptr = neighbor_graph['indptr']
+    starts, ends = indptr[rows], indptr[np.asarray(rows) + 1]
+    lengths = ends - starts
+    if lengths.sum() == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+    
+    # Flat positions of every edge: start of its row + offset within the row
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    positions = np.repeat(starts, lengths) + offsets
+    sources = np.repeat(rows, lengths)
+    return sources, np.asarray(neighbor_graph['neighbors'][positions], dtype=np.int64), \
+        np.asarray(neighbor_graph['weights'][positions])
+
+
+def graph_similarity_record(task_id):
+    """A similarities.json-style record for one task, read from the graph"""
+    row = graph_row.get(task_id)
+    if row is None:
+        return None
+    _, targets, weights = graph_adjacency(np.array([row]))
+    task_ids = neighbor_graph['task_ids']
+    return {
+        'task_id': task_id,
+        'similar_tasks': [{'id': int(task_ids[t]), 'similarity': float(w)} for t, w in zip(targets, weights)]
+    }
+
+
+def expand_neighborhood(root_row, hops, floor, max_nodes):
+    """
+    Breadth-first expansion over edges with weight >= floor.
+    Returns (rows, hop of each row, edges as (source, target, weight) arrays).
+    """
+    hop_of = {root_row: 0}
+    frontier = np.array([root_row], dtype=np.int64)
+    edge_parts = []
+    
+    for hop in range(1, hops + 1):
+        sources, targets, weights = graph_adjacency(frontier)
+        keep = weights >= floor
+        sources, targets, weights = sources[keep], targets[keep], weights[keep]
+        
+        new_rows = []
+        for t in np.unique(targets):
+            if len(hop_of) >= max_nodes:
+                break
+            if int(t) not in hop_of:
+                hop_of[int(t)] = hop
+                new_rows.append(int(t))
+        
+        # Keep edges whose endpoints both made it in
+        inside = np.array([int(t) in hop_of for t in targets], dtype=bool)
+        edge_parts.append((sources[inside], targets[inside], weights[inside]))
+        
+        frontier = np.array(new_rows, dtype=np.int64)
+        if len(frontier) == 0:
+            break
+    
+    edges = tuple(np.concatenate(parts) for parts in zip(*edge_parts)) if edge_parts else ((), (), ())
+    return hop_of, edges
+
+
+@app.route('/api/neighborhood/<int:task_id>', methods=['GET'])
+def get_neighborhood(task_id):
+    """
+    Multi-hop neighborhood of a task in the top-k similarity graph.
+    Query params:
+      - hops: 1-3 (default 2)
+      - floor: minimum edge similarity (default 0.7)
+      - max_nodes: cap on returned tasks (default 200)
+      - fields: comma-separated task fields (default: id, task_name, category, source_dataset)
+    """
+    if not neighbor_graph:
+        return jsonify({'error': 'Neighbor graph not available'}), 404
+    
+    root_row = graph_row.get(task_id)
+    if root_row is None:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    hops = min(max(request.args.get('hops', default=2, type=int), 1), 3)
+    floor = request.args.get('floor', default=0.7, type=float)
+    max_nodes = min(max(request.args.get('max_nodes', default=200, type=int), 1), 5000)
+    fields = parse_fields(request.args.get('fields') or 'id,task_name,category,source_dataset')
+    
+    hop_of, (sources, targets, weights) = expand_neighborhood(root_row, hops, floor, max_nodes)
+    task_ids = neighbor_graph['task_ids']
+    
+    nodes = []
+    for row, hop in hop_of.items():
+        tid = int(task_ids[row])
+        node = project_task(task_index.get(tid, {'id': tid}), fields)
+        node['hop'] = hop
+        nodes.append(node)
+    
+    result = {
+        'root': task_id,
+        'hops': hops,
+        'floor': floor,
+        'nodes': nodes,
+        'links': [{'source': int(task_ids[s]), 'target': int(task_ids[t]), 'similarity': float(w)}
+                  for s, t, w in zip(sources, targets, weights)]
+    }
+    
+    return json.dumps(sanitize_obj(result), cls=NpEncoder), 200, {'Content-Type': 'application/json'}
+
+
+@lru_cache(maxsize=16)
+def graph_components(floor):
+    """
+    Connected components of the graph restricted to edges >= floor (undirected).
+    Returns (labels per row, component sizes, mean internal edge weight per component).
+    """
+    n = len(neighbor_graph['task_ids'])
+    rows = np.arange(n)
+    sources, targets, weights = graph_adjacency(rows)
+    keep = weights >= floor
+    sources, targets, weights = sources[keep], targets[keep], weights[keep]
+    
+    # Union-find by repeated min-label propagation over the (symmetric) edge list
+    labels = rows.copy()
+    while True:
+        lowest = np.minimum(labels[sources], labels[targets])
+        updated = labels.copy()
+        np.minimum.at(updated, sources, lowest)
+        np.minimum.at(updated, targets, lowest)
+        # Pointer jumping so long chains collapse in few rounds
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    
+    _, labels = np.unique(labels, return_inverse=True)
+    sizes = np.bincount(labels)
+    edge_counts = np.bincount(labels[sources], minlength=len(sizes))
+    edge_weights = np.bincount(labels[sources], weights=weights, minlength=len(sizes))
+    mean_weight = np.divide(edge_weights, edge_counts, out=np.zeros(len(sizes)), where=edge_counts > 0)
+    return labels, sizes, mean_weight
+
+
+@app.route('/api/graph/components', methods=['GET'])
+def get_graph_components():
+    """
+    Connected-component summary of the similarity graph at a similarity floor.
+    Query params:
+      - floor: minimum edge similarity (default 0.7)
+      - top: number of largest components to describe (default 20)
+    """
+    if not neighbor_graph:
+        return jsonify({'error': 'Neighbor graph not available'}), 404
+    
+    floor = round(request.args.get('floor', default=0.7, type=float), 3)
+    top = min(max(request.args.get('top', default=20, type=int), 0), 500)
+    labels, sizes, mean_weight = graph_components(floor)
+    task_ids = neighbor_graph['task_ids']
+    
+    largest = np.argsort(-sizes, kind='stable')[:top]
+    members_of = np.argsort(labels, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(sizes)])
+    
+    components = []
+    for c in largest:
+        members = members_of[starts[c]:starts[c + 1]]
+        categories = {}
+        for row in members:
+            cat = task_index.get(int(task_ids[row]), {}).get('category')
+            categories[cat] = categories.get(cat, 0) + 1
+        components.append({
+            'component_id': int(c),
+            'size': int(sizes[c]),
+            'mean_similarity': round(float(mean_weight[c]), 4),
+            'top_categories': sorted(categories.items(), key=lambda kv: -kv[1])[:3],
+            'example_task_ids': [int(task_ids[r]) for r in members[:10]]
+        })
+    
+    result = {
+        'floor': floor,
+        'num_tasks': int(len(labels)),
+        'num_components': int(len(sizes)),
+        'num_singletons': int((sizes == 1).sum()),
+        'components': components
+    }
+    
+    return json.dumps(sanitize_obj(result), cls=NpEncoder), 200, {'Content-Type': 'application/json'}
+
+
+@app.route('/api/graph/component/<int:task_id>', methods=['GET'])
+def get_graph_component(task_id):
+    """
+    Members of the connected component containing a task.
+    Query params:
+      - floor: minimum edge similarity (default 0.7)
+      - limit: max member ids returned (default 500)
+    """
+    if not neighbor_graph:
+        return jsonify({'error': 'Neighbor graph not available'}), 404
+    
+    row = graph_row.get(task_id)
+    if row is None:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    floor = round(request.args.get('floor', default=0.7, type=float), 3)
+    limit = max(request.args.get('limit', default=500, type=int), 0)
+    labels, sizes, mean_weight = graph_components(floor)
+    c = labels[row]
+    members = np.flatnonzero(labels == c)
+    
+    result = {
+        'task_id': task_id,
+        'floor': floor,
+        'component_id': int(c),
+        'size': int(sizes[c]),
+        'mean_similarity': round(float(mean_weight[c]), 4),
+        'task_ids': [int(neighbor_graph['task_ids'][r]) for r in members[:limit]]
+    }
+    
     return json.dumps(sanitize_obj(result), cls=NpEncoder), 200, {'Content-Type': 'application/json'}
 
 
+# ============================================
+# Model Results Store
+# ============================================
+
+NUM_BINS = 20
+BIN_EDGES = np.round(np.linspace(0.0, 1.0, NUM_BINS + 1), 2)
+BIN_CENTERS = (BIN_EDGES[:-1] + BIN_EDGES[1:]) / 2
+
+# Columnar copy of model_results: one row per task, one column per similarity bin
+results_row = {}
+results_accuracy = np.zeros((0, NUM_BINS), dtype=np.float32)
+results_counts = np.zeros((0, NUM_BINS), dtype=np.int32)
+results_overall = np.zeros(0, dtype=np.float32)
+# True for store rows filled by simulate_results_arrays (no real results for that task)
+results_simulated = np.zeros(0, dtype=bool)
+
+def build_results_store():
+    """
+    Pack model_results into N x NUM_BINS arrays.
+    Tasks without real results get simulated rows so corpus-wide aggregates need no special cases.
+    """
+    global results_row, results_accuracy, results_counts, results_overall, results_simulated
+    
+    ids = [t.get('id') for t in tasks_data]
+    known = set(ids)
+    ids.extend(r.get('task_id') for r in model_results if r.get('task_id') not in known)
+    results_row = {tid: i for i, tid in enumerate(ids)}
+    
+    accuracy, counts, overall = simulate_results_arrays(ids)
+    have_real = np.zeros(len(ids), dtype=bool)
+    
+    for r in model_results:
+        row = results_row[r.get('task_id')]
+        bins = r.get('bins', [])[:NUM_BINS]
+        accuracy[row, :] = 0.0
+        counts[row, :] = 0
+        accuracy[row, :len(bins)] = [b.get('accuracy') or 0.0 for b in bins]
+        counts[row, :len(bins)] = [b.get('num_instances') or 0 for b in bins]
+        overall[row] = r.get('overall_accuracy') or 0.0
+        have_real[row] = True
+    
+    results_accuracy, results_counts, results_overall = accuracy, counts, overall
+    results_simulated = ~have_real
+    print(f" - Results store: {int(have_real.sum())} real, {int((~have_real).sum())} simulated")
+
+
+def _hash_uniform(keys):
+    """Map uint64 keys to deterministic uniforms in [0, 1) (splitmix64)"""
+    with np.errstate(over='ignore'):
+        z = keys + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+def simulate_results_arrays(task_ids):
+    """
+    Vectorized simulated model results for a list of task ids.
+    Each (task, bin) cell draws from its own hashed stream, so a task's results
+    do not depend on which other ids are in the batch.
+    Returns (accuracy, counts, overall) arrays.
+    """
+    ids = np.asarray(task_ids, dtype=np.int64).astype(np.uint64).reshape(-1, 1)
+    base = ids * np.uint64(4 * NUM_BINS) + np.arange(NUM_BINS, dtype=np.uint64) * np.uint64(4)
+    
+    u1 = _hash_uniform(base)
+    u2 = _hash_uniform(base + np.uint64(1))
+    u3 = _hash_uniform(base + np.uint64(2))
+    noise = np.sqrt(-2.0 * np.log1p(-u1)) * np.cos(2.0 * np.pi * u2) * 0.08
+    
+    low = BIN_EDGES[:-1]
+    # Simulate: higher similarity bins have higher accuracy
+    accuracy = np.clip(0.15 + low * 0.6 + noise, 0.05, 0.95).round(3)
+    # More instances in middle bins
+    counts = (50 + 100 * (1 - np.abs(0.5 - low) * 2)).astype(np.int64) + np.floor(u3 * 41).astype(np.int64) - 20
+    counts = np.maximum(5, counts)
+    
+    overall = (accuracy * counts).sum(axis=1) / counts.sum(axis=1)
+    return accuracy.astype(np.float32), counts.astype(np.int32), overall.round(3).astype(np.float32)
+
+
+def get_results_arrays(task_ids):
+    """
+    Gather (accuracy, counts, overall) rows for task ids.
+    Ids outside the store are simulated per call and not kept, so clients cannot grow memory.
+    """
+    rows = [results_row.get(tid) for tid in task_ids]
+    missing = [i for i, row in enumerate(rows) if row is None]
+    
+    accuracy = np.empty((len(task_ids), NUM_BINS), dtype=np.float32)
+    counts = np.empty((len(task_ids), NUM_BINS), dtype=np.int32)
+    overall = np.empty(len(task_ids), dtype=np.float32)
+    found = [i for i, row in enumerate(rows) if row is not None]
+    if found:
+        store_rows = [rows[i] for i in found]
+        accuracy[found], counts[found], overall[found] = \
+            results_accuracy[store_rows], results_counts[store_rows], results_overall[store_rows]
+    if missing:
+        accuracy[missing], counts[missing], overall[missing] = \
+            simulate_results_arrays([task_ids[i] for i in missing])
+    return accuracy, counts, overall
+
+
+def simulated_mask(task_ids):
+    """True for task ids whose results are simulated (simulated store rows and ids outside the store)"""
+    return np.array([results_row.get(tid) is None or bool(results_simulated[results_row[tid]])
+                     for tid in task_ids], dtype=bool)
+
+
+def results_to_dict(task_id, accuracy, counts, overall):
+    """Format one row of the store in the model_results.json layout"""
+    bins = []
+    for i in range(NUM_BINS):
+        bins.append({
+            'sim_range': [float(BIN_EDGES[i]), float(BIN_EDGES[i + 1])],
+            'accuracy': round(float(accuracy[i]), 3),
+            'num_instances': int(counts[i])
+        })
+    return {
+        'task_id': task_id,
+        'overall_accuracy': round(float(overall), 3),
+        'bins': bins
+    }
+
+
+def aggregate_results(accuracy, counts, simulated):
+    """
+    Pool a set of result rows; simulated marks the rows without real results.
+    bias_skew is the instance-weighted slope of accuracy against bin similarity:
+    positive when high-overlap instances are answered better (top-heavy beeswarm).
+    """
+    weighted = accuracy.astype(np.float64) * counts
+    pooled_counts = counts.sum(axis=0)
+    pooled_acc_sum = weighted.sum(axis=0)
+    total = int(pooled_counts.sum())
+    
+    pooled_accuracy = np.divide(pooled_acc_sum, pooled_counts,
+                                out=np.zeros(NUM_BINS), where=pooled_counts > 0)
+    overall = float(pooled_acc_sum.sum() / total) if total > 0 else 0.0
+    
+    bias_skew = 0.0
+    if total > 0:
+        mean_x = float((pooled_counts * BIN_CENTERS).sum() / total)
+        var_x = float((pooled_counts * (BIN_CENTERS - mean_x) ** 2).sum())
+        if var_x > 0:
+            bias_skew = float(((BIN_CENTERS - mean_x) * (pooled_acc_sum - pooled_counts * overall)).sum() / var_x)
+    
+    return {
+        'num_tasks': int(len(accuracy)),
+        'num_simulated': int(np.count_nonzero(simulated)),
+        'num_instances': total,
+        'overall_accuracy': round(overall, 3),
+        'bias_skew': round(bias_skew, 3),
+        'bins': [{
+            'sim_range': [float(BIN_EDGES[i]), float(BIN_EDGES[i + 1])],
+            'accuracy': round(float(pooled_accuracy[i]), 3),
+            'num_instances': int(pooled_counts[i])
+        } for i in range(NUM_BINS)]
+    }
+
+
 @app.route('/api/model_results/<int:task_id>', methods=['GET'])
 def get_model_results(task_id):
-    """Get model results for a single task"""
-    result = next((r for r in model_results if r.get('task_id') == task_id), None)
-    
-    if not result:
-        # Return simulated results if not available
-        result = generate_simulated_results(task_id)
+    """Get model results for a single task (simulated if not available)"""
+    if not TASK_ID_MIN <= task_id <= TASK_ID_MAX:
+        return jsonify({'error': 'task_id must fit in a signed 64-bit integer'}), 400
+    accuracy, counts, overall = get_results_arrays([task_id])
+    result = results_to_dict(task_id, accuracy[0], counts[0], overall[0])
     
     return json.dumps(sanitize_obj(result), cls=NpEncoder), 200, {'Content-Type': 'application/json'}
 
@@ -263,59 +996,579 @@ def get_model_results(task_id):
 @app.route('/api/model_results_batch', methods=['POST'])
 def get_model_results_batch():
     """Get model results for multiple tasks"""
-    data = request.get_json()
-    task_ids = data.get('task_ids', [])
+    task_ids, error = read_task_ids(request.get_json(silent=True))
+    if error:
+        return error
     
-    results = []
-    for tid in task_ids:
-        result = next((r for r in model_results if r.get('task_id') == tid), None)
-        if result:
-            results.append(result)
-        else:
-            results.append(generate_simulated_results(tid))
+    def compute():
+        accuracy, counts, overall = get_results_arrays(task_ids)
+        results = [results_to_dict(tid, accuracy[i], counts[i], overall[i]) for i, tid in enumerate(task_ids)]
+        return json.dumps(sanitize_obj(results), cls=NpEncoder)
     
-    return json.dumps(sanitize_obj(results), cls=NpEncoder), 200, {'Content-Type': 'application/json'}
+    payload = run_heavy(('model_results_batch', tuple(task_ids)), compute)
+    return payload, 200, {'Content-Type': 'application/json'}
 
 
-def generate_simulated_results(task_id):
-    """Generate simulated model results when real data not available"""
-    import random
-    random.seed(task_id)
+@app.route('/api/model_results_aggregate', methods=['POST'])
+def get_model_results_aggregate():
+    """
+    Aggregate model results across a task set.
+    Body (all optional):
+      - task_ids: tasks to include (default: every task)
+      - categories: keep only tasks whose group value is in this list
+      - group_by: 'category', 'source_dataset' or 'domain' to get one aggregate per group
+    Returns overall accuracy, pooled bin histogram and bias skew.
+    """
+    data = request.get_json(silent=True) or {}
+    categories = data.get('categories')
+    group_by = data.get('group_by')
     
-    bins = []
-    for i in range(20):
-        low = i * 0.05
-        high = (i + 1) * 0.05
+    # Omitting task_ids means the whole corpus, so the size cap only applies to explicit lists
+    task_ids, error = read_task_ids(data, required=False)
+    if error:
+        return error
+    if group_by not in (None, 'category', 'source_dataset', 'domain'):
+        return jsonify({'error': f'Unsupported group_by: {group_by}'}), 400
+    if categories is not None and not (isinstance(categories, list) and all(isinstance(c, str) for c in categories)):
+        return jsonify({'error': 'categories must be a list of strings'}), 400
+    
+    key = (tuple(task_ids) if task_ids is not None else None,
+           tuple(sorted(set(categories))) if categories is not None else None, group_by)
+    payload = run_heavy(('model_results_aggregate',) + key,
+                        lambda: model_results_aggregate_payload(task_ids, categories, group_by))
+    return payload, 200, {'Content-Type': 'application/json'}
+
+
+def model_results_aggregate_payload(task_ids, categories, group_by):
+    """Aggregate (optionally grouped) model results for a task set, serialized"""
+    key = group_by or 'category'
+    if task_ids is None:
+        task_ids = [t.get('id') for t in tasks_data]
+    if categories is not None:
+        wanted = set(categories)
+        task_ids = [tid for tid in task_ids if task_index.get(tid, {}).get(key) in wanted]
+    
+    accuracy, counts, _ = get_results_arrays(task_ids)
+    simulated = simulated_mask(task_ids)
+    
+    if not group_by:
+        result = aggregate_results(accuracy, counts, simulated)
+    else:
+        labels = np.array([str(task_index.get(tid, {}).get(group_by)) for tid in task_ids], dtype=object)
+        result = {'group_by': group_by, 'groups': {}}
+        for label in sorted(set(labels)):
+            mask = labels == label
+            result['groups'][label] = aggregate_results(accuracy[mask], counts[mask], simulated[mask])
+    
+    return json.dumps(sanitize_obj(result), cls=NpEncoder)
+
+
+# ============================================
+# Group Views
+# ============================================
+
+GROUP_VIEWS_DIR = os.path.join(PROCESSED_DIR, "group_views")
+GROUPINGS = ('category', 'source_dataset', 'domain')
+
+# Per grouping: centroid similarity and cohesion written by scripts/compute_group_views.py,
+# plus model results pooled at load time from the results store
+group_views = {}
+
+
+def load_group_views():
+    """
+    Load per-group centroid similarity and cohesion, then pool each group's model results.
+    Results are pooled exactly like /api/model_results_aggregate (simulated rows included,
+    counted in num_simulated), so both endpoints rank groups the same way.
+    """
+    global group_views
+    
+    group_views = {}
+    task_ids = [t.get('id') for t in tasks_data]
+    accuracy, counts, _ = get_results_arrays(task_ids)
+    simulated = simulated_mask(task_ids)
+    
+    for grouping in GROUPINGS:
+        stats_path = os.path.join(GROUP_VIEWS_DIR, f'{grouping}.json')
+        if not os.path.exists(stats_path):
+            continue
+        with open(stats_path, 'r', encoding='utf-8') as f:
+            stats = json.load(f)['groups']
         
-        # Simulate: higher similarity bins have higher accuracy
-        base_acc = 0.15 + (low * 0.6)
-        acc = max(0.05, min(0.95, base_acc + random.gauss(0, 0.08)))
+        labels = np.array([str(t.get(grouping)) for t in tasks_data], dtype=object)
+        pooled = []
+        for group in stats:
+            mask = labels == group['label']
+            pooled.append(aggregate_results(accuracy[mask], counts[mask], simulated[mask]))
+            group.update({k: pooled[-1][k] for k in
+                          ('num_instances', 'num_simulated', 'overall_accuracy', 'bias_skew')})
         
-        # More instances in middle bins
-        count = int(50 + 100 * (1 - abs(0.5 - low) * 2) + random.randint(-20, 20))
-        count = max(5, count)
+        group_views[grouping] = {
+            'stats': stats,
+            'pooled': pooled,
+            'label_index': {s['label']: i for i, s in enumerate(stats)},
+            'similarity': np.load(os.path.join(GROUP_VIEWS_DIR, f'{grouping}_similarity.npy'))
+        }
+    
+    if group_views:
+        print(" - Loaded group views: " + ', '.join(f"{name} ({len(v['stats'])})" for name, v in group_views.items()))
+
+
+@app.route('/api/groups/<grouping>', methods=['GET'])
+def get_groups(grouping):
+    """
+    Per-group stats: task count, instances, simulated tasks, overall accuracy, bias skew, cohesion.
+    Query params:
+      - sort: bias_skew, overall_accuracy, cohesion or num_tasks (descending; default: label order)
+      - top: number of groups (default all)
+    """
+    view = group_views.get(grouping)
+    if view is None:
+        return jsonify({'error': f'No group view for {grouping}'}), 404
+    
+    stats = view['stats']
+    sort = request.args.get('sort')
+    if sort:
+        if sort not in ('bias_skew', 'overall_accuracy', 'cohesion', 'num_tasks'):
+            return jsonify({'error': f'Unsupported sort: {sort}'}), 400
+        stats = sorted(stats, key=lambda s: -s[sort])
+    top = request.args.get('top', type=int)
+    if top is not None:
+        stats = stats[:max(0, top)]
+    
+    return json.dumps(sanitize_obj({'grouping': grouping, 'groups': stats}), cls=NpEncoder), 200, {'Content-Type': 'application/json'}
+
+
+@app.route('/api/group_similarity/<grouping>', methods=['GET'])
+def get_group_similarity(grouping):
+    """
+    Inter-group centroid cosine similarity matrix.
+    Query params:
+      - labels: comma-separated subset of groups (default all)
+    """
+    view = group_views.get(grouping)
+    if view is None:
+        return jsonify({'error': f'No group view for {grouping}'}), 404
+    
+    raw_labels = request.args.get('labels')
+    if raw_labels:
+        labels = [l for l in raw_labels.split(',') if l in view['label_index']]
+    else:
+        labels = [s['label'] for s in view['stats']]
+    idx = [view['label_index'][l] for l in labels]
+    
+    result = {
+        'grouping': grouping,
+        'labels': labels,
+        'matrix': np.round(view['similarity'][np.ix_(idx, idx)], 4)
+    }
+    
+    return json.dumps(sanitize_obj(result), cls=NpEncoder), 200, {'Content-Type': 'application/json'}
+
+
+@app.route('/api/groups/<grouping>/<path:label>', methods=['GET'])
+def get_group_detail(grouping, label):
+    """One group's stats, pooled bin histogram and most similar groups"""
+    view = group_views.get(grouping)
+    if view is None:
+        return jsonify({'error': f'No group view for {grouping}'}), 404
+    idx = view['label_index'].get(label)
+    if idx is None:
+        return jsonify({'error': f'Unknown {grouping}: {label}'}), 404
+    
+    sims = view['similarity'][idx].copy()
+    sims[idx] = -np.inf
+    nearest = np.argsort(-sims, kind='stable')[:5]
+    
+    result = dict(view['stats'][idx])
+    result['grouping'] = grouping
+    result['bins'] = view['pooled'][idx]['bins']
+    result['most_similar'] = [{'label': view['stats'][j]['label'], 'similarity': round(float(sims[j]), 4)}
+                              for j in nearest if np.isfinite(sims[j])]
+    
+    return json.dumps(sanitize_obj(result), cls=NpEncoder), 200, {'Content-Type': 'application/json'}
+
+
+# ============================================
+# Similarity Bins
+# ============================================
+
+TOKEN_INDEX_DIR = os.path.join(PROCESSED_DIR, "token_index")
+INSTRUCTION_COMPONENTS = ('definition', 'positive_examples', 'negative_examples')
+TOKEN_RE = re.compile(r'\w+')
+
+# Arrays written by scripts/build_token_index.py, keyed by file stem
+token_arrays = {}
+token_task_row = {}
+
+
+def load_token_index():
+    """Memory-map the token index if the pipeline has built it"""
+    global token_arrays, token_task_row
+    
+    token_arrays, token_task_row = {}, {}
+    compute_similarity_bins.cache_clear()
+    
+    if not os.path.isdir(TOKEN_INDEX_DIR):
+        print("WARNING: token_index/ not found, similarity bins will tokenize on demand")
+        return
+    
+    for name in ('instance',) + INSTRUCTION_COMPONENTS:
+        token_arrays[f'{name}_tokens'] = np.load(os.path.join(TOKEN_INDEX_DIR, f'{name}_tokens.npy'), mmap_mode='r')
+        token_arrays[f'{name}_indptr'] = np.load(os.path.join(TOKEN_INDEX_DIR, f'{name}_indptr.npy'))
+    token_arrays['task_instance_ptr'] = np.load(os.path.join(TOKEN_INDEX_DIR, 'task_instance_ptr.npy'))
+    task_ids = np.load(os.path.join(TOKEN_INDEX_DIR, 'task_ids.npy'))
+    token_task_row = {int(tid): i for i, tid in enumerate(task_ids)}
+    
+    print(f" - Loaded token index: {len(token_arrays['instance_indptr']) - 1} instances")
+
+
+def _runtime_token_ids(text, vocab):
+    ids = {vocab.setdefault(t, len(vocab)) for t in TOKEN_RE.findall(text.lower())}
+    return np.array(sorted(ids), dtype=np.int64)
+
+
+def get_task_token_arrays(task_id, components):
+    """
+    Token ids for a task's instruction components and instances.
+    Returns (instruction_ids, instance_tokens, instance_indptr) where
+    instance_indptr is relative to instance_tokens.
+    """
+    row = token_task_row.get(task_id)
+    
+    if row is not None:
+        parts = []
+        for c in components:
+            indptr = token_arrays[f'{c}_indptr']
+            parts.append(token_arrays[f'{c}_tokens'][indptr[row]:indptr[row + 1]])
+        instruction = np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int32)
         
-        bins.append({
-            'sim_range': [round(low, 2), round(high, 2)],
-            'accuracy': round(acc, 3),
-            'num_instances': count
-        })
+        first, last = token_arrays['task_instance_ptr'][row:row + 2]
+        indptr = token_arrays['instance_indptr'][first:last + 1]
+        tokens = np.asarray(token_arrays['instance_tokens'][indptr[0]:indptr[-1]])
+        return instruction, tokens, indptr - indptr[0]
+    
+    # No index for this task: tokenize the same way build_token_index.py does.
+    # Jaccard only needs ids consistent within this call, so the vocab is local.
+    task = task_index[task_id]
+    vocab = {}
+    texts = []
+    for c in components:
+        if c == 'definition':
+            texts.append(task.get('definition', ''))
+        else:
+            texts.extend(f"{ex.get('input','')} {ex.get('output','')} {ex.get('explanation','')}"
+                         for ex in task.get(c, []))
+    instruction = _runtime_token_ids(' '.join(texts), vocab)
     
-    overall = sum(b['accuracy'] * b['num_instances'] for b in bins) / sum(b['num_instances'] for b in bins)
+    inst_ids = []
+    for inst in task_instances(task):
+        output = inst.get('output', '')
+        reference = ' '.join(output) if isinstance(output, list) else output
+        inst_ids.append(_runtime_token_ids(inst.get('input', '') + ' ' + reference, vocab))
+    indptr = np.zeros(len(inst_ids) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(ids) for ids in inst_ids])
+    tokens = np.concatenate(inst_ids) if inst_ids else np.zeros(0, dtype=np.int64)
+    return instruction, tokens, indptr
+
+
+@lru_cache(maxsize=256)
+def compute_similarity_bins(task_id, components, num_bins, edges):
+    """
+    Jaccard similarity of every instance to the chosen instruction components, binned.
+    Either num_bins (equal-width over [0, 1], same rule as compute_metrics.py)
+    or explicit edges (tuple) is used. Cached per argument combination.
+    """
+    instruction, tokens, indptr = get_task_token_arrays(task_id, components)
+    
+    # Intersection size per instance via a cumulative count of shared tokens
+    shared = np.isin(tokens, instruction)
+    shared_cum = np.zeros(len(shared) + 1, dtype=np.int64)
+    np.cumsum(shared, out=shared_cum[1:])
+    intersection = shared_cum[indptr[1:]] - shared_cum[indptr[:-1]]
+    lengths = np.diff(indptr)
+    union = lengths + len(instruction) - intersection
+    
+    sims = np.zeros(len(lengths), dtype=np.float64)
+    valid = (lengths > 0) & (len(instruction) > 0)
+    sims[valid] = intersection[valid] / union[valid]
+    
+    if edges is None:
+        bin_edges = np.linspace(0.0, 1.0, num_bins + 1)
+        bin_idx = np.minimum((sims * num_bins).astype(np.int64), num_bins - 1)
+        inside = np.ones(len(sims), dtype=bool)
+    else:
+        bin_edges = np.asarray(edges, dtype=np.float64)
+        num_bins = len(bin_edges) - 1
+        inside = (sims >= bin_edges[0]) & (sims <= bin_edges[-1])
+        bin_idx = np.clip(np.searchsorted(bin_edges, sims, side='right') - 1, 0, num_bins - 1)
+    
+    counts = np.bincount(bin_idx[inside], minlength=num_bins)
+    sim_sums = np.bincount(bin_idx[inside], weights=sims[inside], minlength=num_bins)
+    mean_sims = np.divide(sim_sums, counts, out=np.zeros(num_bins), where=counts > 0)
     
     return {
         'task_id': task_id,
-        'overall_accuracy': round(overall, 3),
-        'bins': bins
+        'components': list(components),
+        'num_instances': int(len(sims)),
+        'num_outside': int((~inside).sum()),
+        'instruction_vocabulary': int(len(instruction)),
+        'bins': [{
+            'sim_range': [round(float(bin_edges[i]), 4), round(float(bin_edges[i + 1]), 4)],
+            'num_instances': int(counts[i]),
+            'mean_similarity': round(float(mean_sims[i]), 4)
+        } for i in range(num_bins)],
+        'instance_similarities': sims
     }
 
 
+@app.route('/api/similarity_bins/<int:task_id>', methods=['GET'])
+def get_similarity_bins(task_id):
+    """
+    Bin a task's instances by similarity to its instruction, computed live.
+    Query params:
+      - components: comma-separated subset of definition, positive_examples,
+        negative_examples (default: all three, as in compute_metrics.py)
+      - bins: number of equal-width bins over [0, 1] (default 20)
+      - edges: comma-separated, finite, increasing bin edges (overrides bins; at most 1000 bins)
+      - include_instances: 1 to also return every instance's similarity
+    """
+    if task_id not in task_index:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    raw_components = request.args.get('components')
+    components = tuple(c.strip() for c in raw_components.split(',') if c.strip()) if raw_components else INSTRUCTION_COMPONENTS
+    unknown = [c for c in components if c not in INSTRUCTION_COMPONENTS]
+    if unknown or not components:
+        return jsonify({'error': f'Unknown components: {unknown}', 'allowed': list(INSTRUCTION_COMPONENTS)}), 400
+    # Canonical order so equivalent requests share a cache entry
+    components = tuple(c for c in INSTRUCTION_COMPONENTS if c in components)
+    
+    num_bins = request.args.get('bins', default=20, type=int)
+    edges = None
+    raw_edges = request.args.get('edges')
+    if raw_edges:
+        try:
+            edges = tuple(float(e) for e in raw_edges.split(','))
+        except ValueError:
+            return jsonify({'error': 'edges must be comma-separated numbers'}), 400
+        if not all(math.isfinite(e) for e in edges):
+            return jsonify({'error': 'edges must be finite numbers'}), 400
+        if len(edges) > 1001:
+            return jsonify({'error': 'edges must define at most 1000 bins'}), 400
+        if len(edges) < 2 or any(b <= a for a, b in zip(edges, edges[1:])):
+            return jsonify({'error': 'edges must contain at least two strictly increasing values'}), 400
+    elif not 1 <= num_bins <= 1000:
+        return jsonify({'error': 'bins must be between 1 and 1000'}), 400
+    
+    result = dict(compute_similarity_bins(task_id, components, None if edges else num_bins, edges))
+    sims = result.pop('instance_similarities')
+    if request.args.get('include_instances', default=0, type=int):
+        result['instance_similarities'] = np.round(sims, 4)
+    
+    return json.dumps(sanitize_obj(result), cls=NpEncoder), 200, {'Content-Type': 'application/json'}
+
+
+# ============================================
+# Near Duplicates
+# ============================================
+
+NEAR_DUP_DIR = os.path.join(PROCESSED_DIR, "near_duplicates")
+NEAR_DUP_KINDS = ('instance', 'positive_example', 'negative_example')
+
+# Arrays written by scripts/find_near_duplicates.py, keyed by file stem
+near_dup = {}
+leakage_by_task = {}
+
+
+def load_near_duplicates():
+    """Load MinHash/LSH clusters and index each task's items (CSR by task)"""
+    global near_dup, leakage_by_task
+    
+    near_dup, leakage_by_task = {}, {}
+    if not os.path.isdir(NEAR_DUP_DIR):
+        print("WARNING: near_duplicates/ not found")
+        return
+    
+    for name in ('items_task', 'items_kind', 'items_index', 'items_cluster', 'cluster_items', 'cluster_ptr'):
+        near_dup[name] = np.load(os.path.join(NEAR_DUP_DIR, f'{name}.npy'), mmap_mode='r')
+    
+    # Items of each task that belong to some cluster
+    clustered = np.flatnonzero(np.asarray(near_dup['items_cluster']) >= 0)
+    tasks_of = np.asarray(near_dup['items_task'])[clustered]
+    order = np.argsort(tasks_of, kind='stable')
+    near_dup['task_rows'] = clustered[order]
+    near_dup['task_keys'] = tasks_of[order]
+    
+    with open(os.path.join(NEAR_DUP_DIR, 'leakage.json'), 'r', encoding='utf-8') as f:
+        leakage_by_task = {r['task_id']: r for r in json.load(f)}
+    
+    print(f" - Loaded near duplicates: {len(near_dup['cluster_ptr']) - 1} clusters")
+
+
+def near_dup_item(row):
+    return {
+        'task_id': int(near_dup['items_task'][row]),
+        'kind': NEAR_DUP_KINDS[near_dup['items_kind'][row]],
+        'index': int(near_dup['items_index'][row])
+    }
+
+
+@app.route('/api/near_duplicates/<int:task_id>', methods=['GET'])
+def get_near_duplicates(task_id):
+    """
+    Near-duplicate clusters touching a task, plus its leakage score.
+    Query params:
+      - limit: max clusters, largest first (default 20)
+      - members: max members listed per cluster (default 20)
+    """
+    if not near_dup:
+        return jsonify({'error': 'Near-duplicate data not available'}), 404
+    
+    limit = request.args.get('limit', default=20, type=int)
+    max_members = request.args.get('members', default=20, type=int)
+    
+    keys = near_dup['task_keys']
+    lo, hi = np.searchsorted(keys, task_id, side='left'), np.searchsorted(keys, task_id, side='right')
+    rows = near_dup['task_rows'][lo:hi]
+    
+    # Cluster ids are numbered largest first, so sorting them orders by size
+    cluster_ids = np.unique(np.asarray(near_dup['items_cluster'])[rows])[:max(0, limit)]
+    ptr = near_dup['cluster_ptr']
+    clusters = []
+    for c in cluster_ids:
+        members = near_dup['cluster_items'][ptr[c]:ptr[c + 1]]
+        task_items = rows[np.asarray(near_dup['items_cluster'])[rows] == c]
+        clusters.append({
+            'cluster_id': int(c),
+            'size': int(len(members)),
+            'num_tasks': int(len(np.unique(np.asarray(near_dup['items_task'])[members]))),
+            'task_items': [near_dup_item(r) for r in task_items],
+            'members': [near_dup_item(r) for r in members[:max(0, max_members)]]
+        })
+    
+    result = {
+        'task_id': task_id,
+        'leakage': leakage_by_task.get(task_id),
+        'num_clustered_items': int(len(rows)),
+        'clusters': clusters
+    }
+    
+    return json.dumps(sanitize_obj(result), cls=NpEncoder), 200, {'Content-Type': 'application/json'}
+
+
+@app.route('/api/leakage', methods=['GET'])
+def get_leakage():
+    """
+    Tasks ranked by leakage score (instances nearly copying their positive examples).
+    Query params:
+      - top: number of tasks (default 50)
+      - min_score: minimum leakage score (default 0)
+    """
+    top = request.args.get('top', default=50, type=int)
+    min_score = request.args.get('min_score', default=0.0, type=float)
+    
+    ranked = sorted((r for r in leakage_by_task.values() if r['leakage_score'] >= min_score),
+                    key=lambda r: (-r['leakage_score'], -r['max_similarity']))
+    
+    return json.dumps(sanitize_obj(ranked[:max(0, top)]), cls=NpEncoder), 200, {'Content-Type': 'application/json'}
+
+
+# ============================================
+# Profiling (opt-in)
+# ============================================
+
+# Profiling is off unless LINGO_PROFILE_ROUTES or LINGO_PROFILE_HEADER is set;
+# when off, no view is wrapped and requests run exactly as before.
+#   LINGO_PROFILE_ROUTES: comma-separated endpoint names or URL rules ('*' for all)
+#   LINGO_PROFILE_HEADER: profile any request that carries this header
+#   LINGO_PROFILE_SAMPLE: fraction of matching route requests to profile (default 1)
+PROFILE_ROUTES = {r.strip() for r in os.environ.get('LINGO_PROFILE_ROUTES', '').split(',') if r.strip()}
+PROFILE_HEADER = os.environ.get('LINGO_PROFILE_HEADER', '')
+PROFILE_SAMPLE_RATE = float(os.environ.get('LINGO_PROFILE_SAMPLE', '1.0'))
+PROFILE_DIR = os.environ.get('LINGO_PROFILE_DIR', os.path.join(PROJECT_ROOT, 'profiles'))
+
+# cProfile can only run one profiler at a time; busy means "skip this request"
+_profile_lock = threading.Lock()
+
+
+def save_profile(profiler, endpoint, elapsed, worker_profilers=()):
+    """
+    Write a .prof dump (for pstats/snakeviz) and a top-30 text summary.
+    Profiles taken on heavy-pool workers for this request are merged in.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = f"{endpoint}-{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**6:06d}-{elapsed * 1000:.0f}ms"
+    summary = io.StringIO()
+    stats = pstats.Stats(profiler, stream=summary)
+    for worker_profiler in worker_profilers:
+        stats.add(worker_profiler)
+    stats.dump_stats(os.path.join(PROFILE_DIR, stem + '.prof'))
+    
+    summary.write(f"{request.method} {request.full_path}\n{elapsed * 1000:.1f} ms\n\n")
+    stats.sort_stats('cumulative').print_stats(30)
+    with open(os.path.join(PROFILE_DIR, stem + '.txt'), 'w') as f:
+        f.write(summary.getvalue())
+
+
+def profiled_view(endpoint, view, by_route):
+    """Wrap a view so selected requests run under cProfile"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        wanted = (by_route and random.random() < PROFILE_SAMPLE_RATE) or \
+                 (PROFILE_HEADER and PROFILE_HEADER in request.headers)
+        if not wanted or not _profile_lock.acquire(blocking=False):
+            return view(*args, **kwargs)
+        
+        profiler = cProfile.Profile()
+        g.profiler = profiler
+        start = time.perf_counter()
+        try:
+            return profiler.runcall(view, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _profile_lock.release()
+            save_profile(profiler, endpoint, elapsed, g.pop('worker_profilers', ()))
+            g.pop('profiler', None)
+    
+    return wrapper
+
+
+def enable_profiling():
+    """
+    Wrap API views for profiling if configured.
+    Streaming responses are profiled up to the point the generator is returned.
+    """
+    if not PROFILE_ROUTES and not PROFILE_HEADER:
+        return
+    
+    rules = {}
+    for rule in app.url_map.iter_rules():
+        rules.setdefault(rule.endpoint, set()).add(rule.rule)
+    
+    wrapped = []
+    for endpoint, view in list(app.view_functions.items()):
+        if endpoint in ('static', 'index', 'serve_static'):
+            continue
+        by_route = '*' in PROFILE_ROUTES or endpoint in PROFILE_ROUTES or bool(rules.get(endpoint, set()) & PROFILE_ROUTES)
+        if by_route or PROFILE_HEADER:
+            app.view_functions[endpoint] = profiled_view(endpoint, view, by_route)
+            if by_route:
+                wrapped.append(endpoint)
+    
+    print(f"Profiling enabled -> {PROFILE_DIR}")
+    print(f" - Routes: {', '.join(wrapped) or '(none)'} (sample rate {PROFILE_SAMPLE_RATE})")
+    if PROFILE_HEADER:
+        print(f" - Any request with header {PROFILE_HEADER}")
+
+
 # ============================================
 # Main
 # ============================================
 
 if __name__ == '__main__':
     load_data()
+    enable_profiling()
     print("\n" + "=" * 50)
     print("LINGO Backend Server")
     print("=" * 50)
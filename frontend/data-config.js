@@ -50,6 +50,58 @@ async function loadDataFromDrive(fileKey, showProgress = true) {
     }
 }
 
+// Stream an NDJSON endpoint, calling onRows with each batch of parsed rows as it arrives
+async function loadNDJSON(url, onRows) {
+    const response = await fetch(url);
+
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let total = 0;
+
+    while (true) {
+        const { done, value } = await reader.read();
+        buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+
+        const lines = buffer.split('\n');
+        buffer = done ? '' : lines.pop();
+
+        const rows = lines.filter(function(line) { return line.trim() !== ''; })
+            .map(function(line) { return JSON.parse(line); });
+        if (rows.length > 0) {
+            total += rows.length;
+            onRows(rows);
+        }
+
+        if (done) break;
+    }
+
+    return total;
+}
+
+// Progressively load all tasks from the backend; onRows receives each new batch
+async function loadTasksStream(onRows) {
+    let count = 0;
+    return loadNDJSON(`${CONFIG.API_BASE}/tasks_stream`, function(rows) {
+        count += rows.length;
+        updateLoadingProgress(`Loaded ${count} tasks...`);
+        onRows(rows);
+    });
+}
+
+// Progressively load one task's instances from the backend
+async function loadInstancesStream(taskId, onRows, offset = 0, limit = null) {
+    let url = `${CONFIG.API_BASE}/task/${taskId}/instances_stream?offset=${offset}`;
+    if (limit !== null) {
+        url += `&limit=${limit}`;
+    }
+    return loadNDJSON(url, onRows);
+}
+
 // Load all required data files in parallel
 async function loadAllData() {
     const startTime = Date.now();
@@ -147,4 +199,7 @@ function showError(message) {
 
 // Expose to global scope for debugging
 window.DATA_CONFIG = DATA_CONFIG;
-window.loadAllData = loadAllData;
\ No newline at end of file
+window.loadAllData = loadAllData;
+window.loadNDJSON = loadNDJSON;
+window.loadTasksStream = loadTasksStream;
+window.loadInstancesStream = loadInstancesStream;
@@ -0,0 +1,118 @@
+"""
+Build token-id arrays for every task instance and instruction component.
+The backend memory-maps these to compute per-instance similarity bins on demand
+(any component, any bin edges) without rerunning compute_metrics.py.
+
+Tokens match compute_metrics.py: lowercase \\w+ runs, as a set per text.
+Instance tokens cover input + reference output; example tokens cover
+input + output + explanation of every example.
+
+Usage: python build_token_index.py
+Input: processed/tasks_basic.json
+Output: processed/token_index/ (vocab.json and CSR-style .npy arrays)
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+
+# Paths
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROCESSED_DIR = os.path.join(os.path.dirname(BASE_DIR), "processed")
+INDEX_DIR = os.path.join(PROCESSED_DIR, "token_index")
+
+COMPONENTS = ("definition", "positive_examples", "negative_examples")
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def get_tokens(text):
+    if not text: return set()
+    return set(TOKEN_RE.findall(text.lower()))
+
+
+def instance_text(inst):
+    output = inst.get("output", "")
+    reference = " ".join(output) if isinstance(output, list) else output
+    return inst.get("input", "") + " " + reference
+
+
+def example_text(ex):
+    return f"{ex.get('input','')} {ex.get('output','')} {ex.get('explanation','')}"
+
+
+def component_text(task, component):
+    if component == "definition":
+        return task.get("definition", "")
+    return " ".join(example_text(ex) for ex in task.get(component, []))
+
+
+class TokenTable:
+    """Accumulates token-id sets as one flat array plus row offsets (CSR)."""
+
+    def __init__(self, vocab):
+        self.vocab = vocab
+        self.chunks = []
+        self.indptr = [0]
+
+    def add(self, tokens):
+        # Assign new ids in sorted token order: set order varies with the hash seed
+        ids = np.fromiter((self.vocab.setdefault(t, len(self.vocab)) for t in sorted(tokens)),
+                          dtype=np.int32, count=len(tokens))
+        ids.sort()
+        self.chunks.append(ids)
+        self.indptr.append(self.indptr[-1] + len(ids))
+
+    def save(self, name):
+        tokens = np.concatenate(self.chunks) if self.chunks else np.zeros(0, dtype=np.int32)
+        np.save(os.path.join(INDEX_DIR, f"{name}_tokens.npy"), tokens)
+        np.save(os.path.join(INDEX_DIR, f"{name}_indptr.npy"), np.asarray(self.indptr, dtype=np.int64))
+        return len(tokens)
+
+
+def main(tasks=None):
+    if tasks is None:
+        print("Loading tasks...")
+        with open(os.path.join(PROCESSED_DIR, "tasks_basic.json"), "r", encoding="utf-8") as f:
+            tasks = json.load(f)
+    print(f"Loaded {len(tasks)} tasks")
+
+    os.makedirs(INDEX_DIR, exist_ok=True)
+
+    vocab = {}
+    instances = TokenTable(vocab)
+    components = {c: TokenTable(vocab) for c in COMPONENTS}
+    # Row range of each task's instances inside the instance table
+    task_instance_ptr = [0]
+
+    for i, task in enumerate(tasks):
+        if (i + 1) % 200 == 0:
+            print(f"Tokenizing task {i + 1}/{len(tasks)}...")
+
+        for c in COMPONENTS:
+            components[c].add(get_tokens(component_text(task, c)))
+
+        task_instances = task.get("instances", [])
+        for inst in task_instances:
+            instances.add(get_tokens(instance_text(inst)))
+        task_instance_ptr.append(task_instance_ptr[-1] + len(task_instances))
+
+    print("Saving token index...")
+    num_tokens = instances.save("instance")
+    np.save(os.path.join(INDEX_DIR, "task_instance_ptr.npy"), np.asarray(task_instance_ptr, dtype=np.int64))
+    np.save(os.path.join(INDEX_DIR, "task_ids.npy"), np.asarray([t["id"] for t in tasks], dtype=np.int64))
+    for c in COMPONENTS:
+        components[c].save(c)
+
+    vocab_list = sorted(vocab, key=vocab.get)
+    with open(os.path.join(INDEX_DIR, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab_list, f, ensure_ascii=False)
+
+    print(f"Done! {task_instance_ptr[-1]} instances, {num_tokens} instance tokens, vocabulary {len(vocab_list)}")
+    print(f"Saved to {INDEX_DIR}")
+
+
+if __name__ == "__main__":
+    main()
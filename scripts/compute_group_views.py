@@ -0,0 +1,79 @@
+"""
+Precompute category / source-dataset / domain aggregate views.
+For each grouping: per-group embedding centroids, the inter-group centroid
+similarity matrix and group cohesion (mean member-to-centroid cosine).
+
+Model results are not pooled here: the backend pools them per group at load
+time from its results store, with the same policy as /api/model_results_aggregate
+(tasks without results get simulated rows, reported as num_simulated).
+
+Usage: python compute_group_views.py
+Input: processed/tasks_basic.json, processed/embeddings*.npy
+Output: processed/group_views/<group>_{centroids,similarity}.npy
+        and processed/group_views/<group>.json
+"""
+
+import json
+import os
+
+import numpy as np
+
+from quantize_embeddings import EMBEDDING_FORMAT, load_embeddings, normalize_rows
+
+# Paths
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROCESSED_DIR = os.path.join(os.path.dirname(BASE_DIR), "processed")
+OUTPUT_DIR = os.path.join(PROCESSED_DIR, "group_views")
+
+GROUPINGS = ("category", "source_dataset", "domain")
+
+
+def main(tasks=None):
+    if tasks is None:
+        print("Loading tasks...")
+        with open(os.path.join(PROCESSED_DIR, "tasks_basic.json"), "r", encoding="utf-8") as f:
+            tasks = json.load(f)
+    print(f"Loaded {len(tasks)} tasks")
+
+    embeddings = load_embeddings(EMBEDDING_FORMAT)
+    if len(embeddings) != len(tasks):
+        print(f"Error: Mismatch! {len(tasks)} tasks vs {len(embeddings)} embeddings.")
+        return None
+    normalized = normalize_rows(embeddings)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    for grouping in GROUPINGS:
+        # Same labels as the backend's group_by (a missing field becomes "None")
+        values = [str(t.get(grouping)) for t in tasks]
+        labels, group_of = np.unique(values, return_inverse=True)
+        num_groups = len(labels)
+        sizes = np.bincount(group_of, minlength=num_groups)
+
+        # Centroid = normalized mean of normalized member embeddings
+        sums = np.zeros((num_groups, normalized.shape[1]), dtype=np.float32)
+        np.add.at(sums, group_of, normalized)
+        centroids = normalize_rows(sums)
+        similarity = centroids @ centroids.T
+        cohesion = np.bincount(group_of, weights=(normalized * centroids[group_of]).sum(axis=1),
+                               minlength=num_groups) / sizes
+
+        stats = [{
+            "label": str(labels[g]),
+            "num_tasks": int(sizes[g]),
+            "cohesion": round(float(cohesion[g]), 4),
+        } for g in range(num_groups)]
+
+        np.save(os.path.join(OUTPUT_DIR, f"{grouping}_centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(OUTPUT_DIR, f"{grouping}_similarity.npy"), similarity.astype(np.float32))
+        with open(os.path.join(OUTPUT_DIR, f"{grouping}.json"), "w", encoding="utf-8") as f:
+            json.dump({"grouping": grouping, "groups": stats}, f, ensure_ascii=False)
+
+        print(f"{grouping}: {num_groups} groups, mean cohesion {float(cohesion.mean()) if num_groups else 0.0:.4f}")
+
+    print(f"Saved group views to {OUTPUT_DIR}")
+    return True
+
+
+if __name__ == "__main__":
+    main()
@@ -72,13 +72,15 @@ def call_llm(instruction, instance_input):
         print(f"API Error: {e}")
         return ""
 
-def main():
+def main(tasks=None, similarities=None):
     print(f"Loading tasks...")
     try:
-        with open("processed/tasks_basic.json", "r", encoding="utf-8") as f:
-            tasks = json.load(f)
-        with open("processed/similarities.json", "r", encoding="utf-8") as f:
-            similarities = json.load(f)
+        if tasks is None:
+            with open("processed/tasks_basic.json", "r", encoding="utf-8") as f:
+                tasks = json.load(f)
+        if similarities is None:
+            with open("processed/similarities.json", "r", encoding="utf-8") as f:
+                similarities = json.load(f)
     except FileNotFoundError:
         print("Run process_tasks.py and compute_similarities.py first.")
         return
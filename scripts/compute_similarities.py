@@ -1,65 +1,107 @@
 """
 Computes pairwise cosine similarities between task embeddings.
-Generates: processed/similarities.json
+Generates: processed/similarities.json, processed/neighbor_graph/ (CSR arrays)
 """
 
 import json
 import numpy as np
 import os
-from sklearn.metrics.pairwise import cosine_similarity
+
+from quantize_embeddings import EMBEDDING_FORMAT, EMBEDDING_FILES, load_embeddings, normalize_rows
+from trace_phases import PhaseTracer
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROCESSED_DIR = os.path.join(os.path.dirname(BASE_DIR), "processed")
 
-def main():
-    print("Loading data...")
+NUM_NEIGHBORS = 20
+BLOCK_SIZE = 1024
+GRAPH_DIR = os.path.join(PROCESSED_DIR, "neighbor_graph")
+
+
+def top_neighbors(embeddings, k, block_size=BLOCK_SIZE):
+    """
+    Top-k cosine neighbors of every row (self excluded), most similar first.
+    Returns (neighbors int32 [N x k], weights float32 [N x k]) as row positions.
+    """
+    normalized = normalize_rows(embeddings)
+    n = len(normalized)
+    k = min(k, n - 1)
+    neighbors = np.zeros((n, k), dtype=np.int32)
+    weights = np.zeros((n, k), dtype=np.float32)
     
-    # 1. Load Embeddings
-    emb_path = os.path.join(PROCESSED_DIR, "embeddings.npy")
-    if not os.path.exists(emb_path):
-        print(f"Error: {emb_path} not found. Run generate_embeddings.py first.")
-        return
-    embeddings = np.load(emb_path)
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        scores = normalized[start:end] @ normalized.T
+        scores[np.arange(end - start), np.arange(start, end)] = -np.inf # Skip self
+        
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        neighbors[start:end] = np.take_along_axis(top, order, axis=1)
+        weights[start:end] = np.take_along_axis(top_scores, order, axis=1)
+    
+    return neighbors, weights
+
+
+def save_neighbor_graph(tasks, neighbors, weights):
+    """
+    Write the neighbor lists as CSR arrays the backend memory-maps:
+    indptr (N+1), neighbors (row positions), weights (float32), task_ids (row -> id).
+    """
+    os.makedirs(GRAPH_DIR, exist_ok=True)
+    n, k = neighbors.shape
+    np.save(os.path.join(GRAPH_DIR, "indptr.npy"), np.arange(0, n * k + 1, k, dtype=np.int64))
+    np.save(os.path.join(GRAPH_DIR, "neighbors.npy"), neighbors.reshape(-1))
+    np.save(os.path.join(GRAPH_DIR, "weights.npy"), weights.reshape(-1))
+    np.save(os.path.join(GRAPH_DIR, "task_ids.npy"), np.array([t["id"] for t in tasks], dtype=np.int64))
+    print(f"Saved CSR neighbor graph to {GRAPH_DIR}")
+
+
+def main(tasks=None, embeddings=None):
+    tracer = PhaseTracer("compute_similarities")
+    print("Loading data...")
     
-    # 2. Load Tasks (for IDs)
-    tasks_path = os.path.join(PROCESSED_DIR, "tasks_basic.json")
-    if not os.path.exists(tasks_path):
-        print(f"Error: {tasks_path} not found.")
-        return
-    with open(tasks_path, "r", encoding="utf-8") as f:
-        tasks = json.load(f)
+    with tracer.phase("load"):
+        # 1. Load Embeddings (quantized store if present, see quantize_embeddings.py)
+        if embeddings is None:
+            emb_path = os.path.join(PROCESSED_DIR, "embeddings.npy")
+            if not os.path.exists(emb_path):
+                print(f"Error: {emb_path} not found. Run generate_embeddings.py first.")
+                return None
+            embeddings = load_embeddings(EMBEDDING_FORMAT)
+            print(f"Using {embeddings.dtype} embeddings ({EMBEDDING_FILES[EMBEDDING_FORMAT]} if present)")
+        
+        # 2. Load Tasks (for IDs)
+        if tasks is None:
+            tasks_path = os.path.join(PROCESSED_DIR, "tasks_basic.json")
+            if not os.path.exists(tasks_path):
+                print(f"Error: {tasks_path} not found.")
+                return None
+            with open(tasks_path, "r", encoding="utf-8") as f:
+                tasks = json.load(f)
 
     if len(tasks) != len(embeddings):
         print(f"Error: Mismatch! {len(tasks)} tasks vs {len(embeddings)} embeddings.")
-        return
+        return None
 
-    print(f"Computing similarity matrix for {len(embeddings)} tasks...")
+    print(f"Computing top-{NUM_NEIGHBORS} neighbors for {len(embeddings)} tasks...")
     
-    # 3. Compute Cosine Similarity (Vectorized = Fast)
-    # Result is a square matrix [N x N] where cell [i][j] is similarity between task i and j
-    sim_matrix = cosine_similarity(embeddings)
+    # 3. Compute Cosine Similarity (Vectorized = Fast), one block of rows at a time
+    # so memory stays at BLOCK_SIZE x N instead of the full N x N matrix
+    # (int8 vectors work as-is: their per-vector scale cancels out in the cosine)
+    with tracer.phase("top_neighbors"):
+        neighbors, weights = top_neighbors(embeddings, NUM_NEIGHBORS)
 
-    # 4. Extract Top Neighbors for each task
+    # 4. Build the JSON neighbor lists
     # We store the top 20 neighbors to keep the JSON file size manageable
     final_output = []
-    
-    print("Extracting top neighbors...")
     for i, task in enumerate(tasks):
-        # Get similarity scores for task i
-        scores = sim_matrix[i]
-        
-        # Get indices of top 21 scores (including itself at index 0)
-        # argsort sorts ascending, so we take the last 21 and reverse
-        top_indices = np.argsort(scores)[-21:][::-1]
-        
         similar_tasks = []
-        for idx in top_indices:
-            if idx == i: continue # Skip self
-            
+        for idx, score in zip(neighbors[i], weights[i]):
             similar_tasks.append({
                 "id": tasks[idx]["id"],
-                "similarity": float(scores[idx]) # Convert numpy float to standard float
+                "similarity": float(score) # Convert numpy float to standard float
             })
 
         final_output.append({
@@ -70,10 +112,15 @@ def main():
     # 5. Save
     out_path = os.path.join(PROCESSED_DIR, "similarities.json")
     print(f"Saving to {out_path}...")
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(final_output, f)
+    with tracer.phase("save"):
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(final_output, f)
+        save_neighbor_graph(tasks, neighbors, weights)
     
     print("Done! Similarity calculation complete.")
+    tracer.save()
+    
+    return final_output
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
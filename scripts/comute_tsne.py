@@ -10,10 +10,11 @@ Output: processed/coords_3d.npy
 import numpy as np
 from sklearn.manifold import TSNE
 
-def main():
-    # Load embeddings
-    print("Loading embeddings...")
-    embeddings = np.load("processed/embeddings.npy")
+def main(embeddings=None):
+    # Load embeddings (unless already loaded by the pipeline runner)
+    if embeddings is None:
+        print("Loading embeddings...")
+        embeddings = np.load("processed/embeddings.npy")
     print(f"Embeddings shape: {embeddings.shape}")
     
     # Compute t-SNE with 3 components
@@ -42,6 +43,8 @@ def main():
     # Save
     np.save("processed/coords_3d.npy", coords_normalized)
     print("Saved 3D coordinates to processed/coords_3d.npy")
+    
+    return coords_normalized
 
 
 if __name__ == "__main__":
@@ -1,55 +1,90 @@
 """
 Step 5: Combine all processed data into final format.
-Creates the final tasks_processed.json with all fields needed for visualization.
+Writes the final dataset as split artifacts in one streaming pass over the tasks:
+a compact task-metadata table with the 3D coordinates joined in, and the instances
+in a separate file, one JSON line per instance, located by byte offset.
+Categories and the summary are collected in the same pass.
+
+The backend loads tasks.json as-is (no coordinate merge) and reads only the
+instance lines a request needs:
+    instance rows of task row t:  task_instance_ptr[t] .. task_instance_ptr[t + 1]
+    instance row i:               instances.jsonl[instance_offsets[i]:instance_offsets[i + 1]]
 
 Usage: python create_final_data.py
-Input: processed/tasks_basic.json, processed/coords_3d.npy, processed/similarities.json
-Output: processed/tasks_processed.json, processed/categories.json, processed/summary.json
+Input: processed/tasks_basic.json, processed/coords_3d.npy
+Output: processed/final/tasks.json, processed/final/instances.jsonl,
+        processed/final/instance_offsets.npy, processed/final/task_instance_ptr.npy,
+        processed/categories.json, processed/summary.json
 """
 
 import json
+import os
 import numpy as np
 
-def main():
-    # Load all data
-    print("Loading tasks...")
-    with open("processed/tasks_basic.json", "r", encoding="utf-8") as f:
-        tasks = json.load(f)
+FINAL_DIR = "processed/final"
+
+
+def main(tasks=None, coords_3d=None):
+    # Load all data (anything the pipeline runner already has is passed in)
+    if tasks is None:
+        print("Loading tasks...")
+        with open("processed/tasks_basic.json", "r", encoding="utf-8") as f:
+            tasks = json.load(f)
     print(f"Loaded {len(tasks)} tasks")
-    
-    print("Loading 3D coordinates...")
-    coords_3d = np.load("processed/coords_3d.npy")
+
+    if coords_3d is None:
+        print("Loading 3D coordinates...")
+        coords_3d = np.load("processed/coords_3d.npy")
     print(f"Coordinates shape: {coords_3d.shape}")
-    
-    print("Loading similarities...")
-    with open("processed/similarities.json", "r") as f:
-        similarities = json.load(f)
-    print(f"Loaded similarities for {len(similarities)} tasks")
-    
-    # Add 3D coordinates to tasks
-    print("Adding coordinates to tasks...")
-    for i, task in enumerate(tasks):
-        task["x"] = float(coords_3d[i, 0])
-        task["y"] = float(coords_3d[i, 1])
-        task["z"] = float(coords_3d[i, 2])
-    
-    # Save final tasks
-    print("Saving tasks_processed.json...")
-    with open("processed/tasks_processed.json", "w", encoding="utf-8") as f:
-        json.dump(tasks, f, indent=2, ensure_ascii=False)
-    
-    # Extract and save categories
-    categories = sorted(list(set(task["category"] for task in tasks)))
+
+    if len(coords_3d) != len(tasks):
+        print(f"Error: Mismatch! {len(tasks)} tasks vs {len(coords_3d)} coordinates.")
+        return None
+
+    os.makedirs(FINAL_DIR, exist_ok=True)
+
+    # Single pass: one metadata record per task and one line per instance.
+    # Records are built fresh, so tasks shared with other stages are left untouched.
+    print("Writing task table and instances...")
+    categories, domains, sources = set(), set(), set()
+    task_instance_ptr = np.zeros(len(tasks) + 1, dtype=np.int64)
+    offsets = [0]
+
+    with open(os.path.join(FINAL_DIR, "tasks.json"), "w", encoding="utf-8") as meta_f, \
+            open(os.path.join(FINAL_DIR, "instances.jsonl"), "wb") as inst_f:
+        meta_f.write("[")
+        for i, task in enumerate(tasks):
+            record = {k: v for k, v in task.items() if k != "instances"}
+            record["x"] = float(coords_3d[i, 0])
+            record["y"] = float(coords_3d[i, 1])
+            record["z"] = float(coords_3d[i, 2])
+            if i:
+                meta_f.write(",\n")
+            meta_f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+
+            instances = task.get("instances", [])
+            for inst in instances:
+                line = json.dumps(inst, ensure_ascii=False, separators=(",", ":"))
+                offsets.append(offsets[-1] + inst_f.write((line + "\n").encode("utf-8")))
+            task_instance_ptr[i + 1] = task_instance_ptr[i] + len(instances)
+
+            categories.add(task["category"])
+            domains.add(task["domain"])
+            sources.add(task["source_dataset"])
+        meta_f.write("]\n")
+
+    np.save(os.path.join(FINAL_DIR, "instance_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+    np.save(os.path.join(FINAL_DIR, "task_instance_ptr.npy"), task_instance_ptr)
+
+    # Save categories
+    categories = sorted(categories)
     print(f"Found {len(categories)} unique categories")
     with open("processed/categories.json", "w") as f:
         json.dump(categories, f, indent=2)
-    
-    # Extract domains
-    domains = sorted(list(set(task["domain"] for task in tasks)))
-    
-    # Extract source datasets
-    sources = sorted(list(set(task["source_dataset"] for task in tasks)))
-    
+
+    domains = sorted(domains)
+    sources = sorted(sources)
+
     # Create summary
     summary = {
         "num_tasks": len(tasks),
@@ -60,14 +95,17 @@ def main():
         "domains": domains,
         "sources": sources
     }
-    
+
     print("Saving summary.json...")
     with open("processed/summary.json", "w") as f:
         json.dump(summary, f, indent=2)
-    
+
     print("\n" + "=" * 50)
     print("Done! Final files created:")
-    print("  - processed/tasks_processed.json")
+    print(f"  - {FINAL_DIR}/tasks.json")
+    print(f"  - {FINAL_DIR}/instances.jsonl ({task_instance_ptr[-1]} instances, {offsets[-1] / 1e6:.1f} MB)")
+    print(f"  - {FINAL_DIR}/instance_offsets.npy")
+    print(f"  - {FINAL_DIR}/task_instance_ptr.npy")
     print("  - processed/categories.json")
     print("  - processed/summary.json")
     print("=" * 50)
@@ -77,6 +115,8 @@ def main():
     print(f"  Domains: {len(domains)}")
     print(f"  Source datasets: {len(sources)}")
 
+    return summary
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,267 @@
+"""
+Find near-duplicate instances and examples with MinHash + LSH.
+Every instance and every positive/negative example is a token set (same tokens as
+compute_metrics.py). Each set gets a NUM_PERM-value MinHash signature; signatures
+are split into BANDS bands of ROWS values and items sharing a band bucket become
+candidates. Candidates whose estimated Jaccard is >= SIM_THRESHOLD are linked, and
+the connected components are the near-duplicate clusters.
+
+Examples are matched on input + output only (the same fields as instances; the
+explanation would keep a verbatim copy below the threshold).
+Per-task leakage is the share of a task's instances that nearly copy one of its
+own positive examples (estimated Jaccard >= SIM_THRESHOLD).
+
+Usage: python find_near_duplicates.py
+Input: processed/tasks_basic.json, processed/token_index/ (build_token_index.py)
+Output: processed/near_duplicates/ (item/cluster arrays, clusters.json, leakage.json)
+"""
+
+import json
+import os
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from build_token_index import INDEX_DIR, get_tokens, instance_text
+from trace_phases import PhaseTracer
+
+# Paths
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROCESSED_DIR = os.path.join(os.path.dirname(BASE_DIR), "processed")
+OUTPUT_DIR = os.path.join(PROCESSED_DIR, "near_duplicates")
+
+# MinHash / LSH parameters (BANDS * ROWS == NUM_PERM)
+NUM_PERM = 64
+BANDS = 16
+ROWS = 4
+SIM_THRESHOLD = 0.8
+# Sets this small are trivially "duplicates" (e.g. "yes") and are left out
+MIN_TOKENS = 5
+# Tokens hashed per chunk; bounds the (NUM_PERM x chunk) uint64 work array
+CHUNK_TOKENS = 250_000
+# Members listed per cluster in clusters.json (the arrays keep all of them)
+MAX_LISTED_MEMBERS = 20
+
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+NO_HASH = np.uint32(0xFFFFFFFF)
+
+KINDS = ("instance", "positive_example", "negative_example")
+
+
+def minhash_signatures(tokens, indptr, seed=12230006):
+    """
+    MinHash signatures (n x NUM_PERM, uint32) for CSR token-id sets.
+    Rows with fewer than MIN_TOKENS tokens get NO_HASH everywhere.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, int(MERSENNE_PRIME), NUM_PERM, dtype=np.uint64)[:, None]
+    b = rng.integers(0, int(MERSENNE_PRIME), NUM_PERM, dtype=np.uint64)[:, None]
+
+    n = len(indptr) - 1
+    lengths = np.diff(indptr)
+    signatures = np.full((n, NUM_PERM), NO_HASH, dtype=np.uint32)
+
+    row = 0
+    while row < n:
+        # Grow the chunk until it holds CHUNK_TOKENS tokens (at least one row)
+        end = int(np.searchsorted(indptr, indptr[row] + CHUNK_TOKENS, side="right")) - 1
+        end = min(max(end, row + 1), n)
+
+        rows = np.arange(row, end)
+        rows = rows[lengths[row:end] >= MIN_TOKENS]
+        if len(rows):
+            chunk = np.asarray(tokens[indptr[row]:indptr[end]], dtype=np.uint64)
+            hashed = (a * chunk[None, :] + b) % MERSENNE_PRIME
+            starts = indptr[rows] - indptr[row]
+            mins = np.minimum.reduceat(hashed, starts, axis=1)
+            # reduceat runs each segment to the next start; trim the ones that overran
+            # into skipped short rows by recomputing them exactly
+            ends = indptr[rows + 1] - indptr[row]
+            next_starts = np.append(starts[1:], len(chunk))
+            for j in np.flatnonzero(ends != next_starts):
+                mins[:, j] = hashed[:, starts[j]:ends[j]].min(axis=1)
+            signatures[rows] = mins.T.astype(np.uint32)
+        row = end
+
+    return signatures
+
+
+def lsh_candidate_pairs(signatures, valid):
+    """
+    Candidate pairs: items adjacent in a band's sorted bucket order with equal keys.
+    Linking neighbors (not all pairs) keeps huge buckets linear; the clusters are
+    recovered transitively by connected components.
+    """
+    rng = np.random.default_rng(7)
+    multipliers = rng.integers(1, 1 << 63, ROWS, dtype=np.uint64) | np.uint64(1)
+    items = np.flatnonzero(valid)
+
+    pairs = []
+    for band in range(BANDS):
+        block = signatures[items, band * ROWS:(band + 1) * ROWS].astype(np.uint64)
+        with np.errstate(over="ignore"):
+            keys = (block * multipliers).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        same = keys[order[1:]] == keys[order[:-1]]
+        pairs.append(np.stack([items[order[:-1][same]], items[order[1:][same]]], axis=1))
+
+    pairs = np.concatenate(pairs) if pairs else np.zeros((0, 2), dtype=np.int64)
+    return np.unique(pairs, axis=0)
+
+
+def estimated_jaccard(sig_a, sig_b):
+    """Share of equal MinHash values, row-wise or broadcast."""
+    return (sig_a == sig_b).mean(axis=-1)
+
+
+def main(tasks=None):
+    tracer = PhaseTracer("find_near_duplicates")
+    if tasks is None:
+        print("Loading tasks...")
+        with open(os.path.join(PROCESSED_DIR, "tasks_basic.json"), "r", encoding="utf-8") as f:
+            tasks = json.load(f)
+    print(f"Loaded {len(tasks)} tasks")
+
+    if not os.path.isdir(INDEX_DIR):
+        print(f"Error: {INDEX_DIR} not found. Run build_token_index.py first.")
+        return None
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    # 1. Items: instances come from the token index, examples are tokenized here
+    instance_tokens = np.load(os.path.join(INDEX_DIR, "instance_tokens.npy"), mmap_mode="r")
+    instance_indptr = np.load(os.path.join(INDEX_DIR, "instance_indptr.npy"))
+    task_instance_ptr = np.load(os.path.join(INDEX_DIR, "task_instance_ptr.npy"))
+    with open(os.path.join(INDEX_DIR, "vocab.json"), "r", encoding="utf-8") as f:
+        vocab = {t: i for i, t in enumerate(json.load(f))}
+
+    task_ids = np.array([t["id"] for t in tasks], dtype=np.int64)
+    inst_counts = np.diff(task_instance_ptr)
+    items_task = [np.repeat(task_ids, inst_counts)]
+    items_kind = [np.zeros(int(task_instance_ptr[-1]), dtype=np.int8)]
+    items_index = [np.arange(int(task_instance_ptr[-1])) - np.repeat(task_instance_ptr[:-1], inst_counts)]
+
+    num_instances = int(task_instance_ptr[-1])
+    example_sets, ex_task, ex_kind, ex_index = [], [], [], []
+    # Item rows of each task's positive examples, for the leakage score
+    positive_rows = []
+    for task in tasks:
+        positive_rows.append([])
+        for kind in (1, 2):
+            for j, ex in enumerate(task.get(KINDS[kind] + "s", [])):
+                if kind == 1:
+                    positive_rows[-1].append(num_instances + len(example_sets))
+                # New tokens get ids in sorted order, so ids do not depend on the hash seed
+                ids = sorted(vocab.setdefault(t, len(vocab)) for t in sorted(get_tokens(instance_text(ex))))
+                example_sets.append(np.array(ids, dtype=np.int64))
+                ex_task.append(task["id"])
+                ex_kind.append(kind)
+                ex_index.append(j)
+    items_task.append(np.array(ex_task, dtype=np.int64))
+    items_kind.append(np.array(ex_kind, dtype=np.int8))
+    items_index.append(np.array(ex_index, dtype=np.int64))
+
+    items_task = np.concatenate(items_task)
+    items_kind = np.concatenate(items_kind)
+    items_index = np.concatenate(items_index).astype(np.int32)
+    print(f"Items: {num_instances} instances, {len(example_sets)} examples")
+
+    # 2. MinHash signatures
+    print("Computing MinHash signatures...")
+    with tracer.phase("minhash"):
+        inst_sigs = minhash_signatures(instance_tokens, instance_indptr)
+        ex_indptr = np.zeros(len(example_sets) + 1, dtype=np.int64)
+        ex_indptr[1:] = np.cumsum([len(s) for s in example_sets])
+        ex_tokens = np.concatenate(example_sets) if example_sets else np.zeros(0, dtype=np.int64)
+        signatures = np.concatenate([inst_sigs, minhash_signatures(ex_tokens, ex_indptr)])
+        valid = signatures[:, 0] != NO_HASH
+
+    # 3. LSH candidates, verified, then connected components
+    print("Bucketing signatures...")
+    with tracer.phase("lsh"):
+        pairs = lsh_candidate_pairs(signatures, valid)
+        if len(pairs):
+            keep = estimated_jaccard(signatures[pairs[:, 0]], signatures[pairs[:, 1]]) >= SIM_THRESHOLD
+            pairs = pairs[keep]
+    print(f"Verified {len(pairs)} near-duplicate links")
+
+    n = len(signatures)
+    graph = coo_matrix((np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    sizes = np.bincount(labels)
+    in_cluster = sizes[labels] >= 2
+    # Renumber clusters 0..C-1, largest first; -1 for singletons
+    cluster_labels = np.unique(labels[in_cluster])
+    cluster_labels = cluster_labels[np.argsort(-sizes[cluster_labels], kind="stable")]
+    remap = np.full(len(sizes), -1, dtype=np.int32)
+    remap[cluster_labels] = np.arange(len(cluster_labels), dtype=np.int32)
+    items_cluster = remap[labels]
+
+    members = np.flatnonzero(items_cluster >= 0)
+    members = members[np.argsort(items_cluster[members], kind="stable")]
+    cluster_ptr = np.zeros(len(cluster_labels) + 1, dtype=np.int64)
+    cluster_ptr[1:] = np.cumsum(np.bincount(items_cluster[members], minlength=len(cluster_labels)))
+
+    # 4. Leakage: instances nearly copying a positive example of their own task
+    print("Scoring leakage...")
+    leakage = []
+    for t, tid in enumerate(task_ids):
+        inst = np.arange(task_instance_ptr[t], task_instance_ptr[t + 1])
+        pos = np.array(positive_rows[t], dtype=np.int64)
+        inst, pos = inst[valid[inst]], pos[valid[pos]]
+        best = np.zeros(len(inst))
+        if len(inst) and len(pos):
+            best = estimated_jaccard(signatures[inst][:, None, :], signatures[pos][None, :, :]).max(axis=1)
+        leaked = int((best >= SIM_THRESHOLD).sum())
+        leakage.append({
+            "task_id": int(tid),
+            "num_instances": int(inst_counts[t]),
+            "num_compared": int(len(inst)),
+            "num_leaked": leaked,
+            "leakage_score": round(leaked / len(inst), 4) if len(inst) else 0.0,
+            "max_similarity": round(float(best.max()), 4) if len(best) else 0.0,
+        })
+
+    # 5. Save
+    print(f"Saving to {OUTPUT_DIR}...")
+    np.save(os.path.join(OUTPUT_DIR, "items_task.npy"), items_task)
+    np.save(os.path.join(OUTPUT_DIR, "items_kind.npy"), items_kind)
+    np.save(os.path.join(OUTPUT_DIR, "items_index.npy"), items_index)
+    np.save(os.path.join(OUTPUT_DIR, "items_cluster.npy"), items_cluster)
+    np.save(os.path.join(OUTPUT_DIR, "cluster_items.npy"), members)
+    np.save(os.path.join(OUTPUT_DIR, "cluster_ptr.npy"), cluster_ptr)
+
+    clusters = []
+    for c in range(len(cluster_labels)):
+        rows = members[cluster_ptr[c]:cluster_ptr[c + 1]]
+        clusters.append({
+            "cluster_id": c,
+            "size": int(len(rows)),
+            "num_tasks": int(len(np.unique(items_task[rows]))),
+            "kinds": {KINDS[k]: int(v) for k, v in enumerate(np.bincount(items_kind[rows], minlength=3)) if v},
+            "members": [{"task_id": int(items_task[r]), "kind": KINDS[items_kind[r]], "index": int(items_index[r])}
+                        for r in rows[:MAX_LISTED_MEMBERS]],
+        })
+    with open(os.path.join(OUTPUT_DIR, "clusters.json"), "w", encoding="utf-8") as f:
+        json.dump(clusters, f)
+    with open(os.path.join(OUTPUT_DIR, "leakage.json"), "w", encoding="utf-8") as f:
+        json.dump(leakage, f)
+    with open(os.path.join(OUTPUT_DIR, "params.json"), "w") as f:
+        json.dump({"num_perm": NUM_PERM, "bands": BANDS, "rows": ROWS,
+                   "sim_threshold": SIM_THRESHOLD, "min_tokens": MIN_TOKENS}, f, indent=2)
+
+    cross_task = sum(1 for c in clusters if c["num_tasks"] > 1)
+    leaky = sum(1 for l in leakage if l["num_leaked"] > 0)
+    print("\n" + "=" * 50)
+    print(f"Near-duplicate clusters: {len(clusters)} ({cross_task} span several tasks)")
+    print(f"Items in clusters: {len(members)} / {n}")
+    print(f"Tasks with leaked instances: {leaky} / {len(leakage)}")
+    print("=" * 50)
+    tracer.save()
+
+    return clusters
+
+
+if __name__ == "__main__":
+    main()
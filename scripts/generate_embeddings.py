@@ -36,11 +36,12 @@ def create_embedding_text(task):
     return " ".join(parts)
 
 
-def main():
-    # Load tasks
-    print("Loading tasks...")
-    with open("processed/tasks_basic.json", "r", encoding="utf-8") as f:
-        tasks = json.load(f)
+def main(tasks=None):
+    # Load tasks (unless already loaded by the pipeline runner)
+    if tasks is None:
+        print("Loading tasks...")
+        with open("processed/tasks_basic.json", "r", encoding="utf-8") as f:
+            tasks = json.load(f)
     print(f"Loaded {len(tasks)} tasks")
     
     # Load model
@@ -64,6 +65,8 @@ def main():
     # Save
     np.save("processed/embeddings.npy", embeddings)
     print("Saved embeddings to processed/embeddings.npy")
+    
+    return embeddings
 
 
 if __name__ == "__main__":
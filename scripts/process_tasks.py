@@ -94,7 +94,7 @@ def main():
         tasks_dir = "natural-instructions-master/tasks"
     
     if not os.path.exists(tasks_dir):
-        return
+        return None
     
     os.makedirs(output_dir, exist_ok=True)
     
@@ -117,6 +117,8 @@ def main():
     print(f"Saving to {output_path}...")
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(tasks, f, indent=2, ensure_ascii=False)
+    
+    return tasks
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
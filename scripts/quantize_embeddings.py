@@ -0,0 +1,172 @@
+"""
+Write quantized copies of the task embeddings and report what they cost in accuracy.
+float16 halves the size; int8 stores one signed byte per dimension plus a float32
+scale per vector (q = round(v / scale), scale = max|v| / 127), about 4x smaller.
+Cosine similarity is scale-invariant, so int8 vectors can be compared directly.
+
+Usage: python quantize_embeddings.py
+Input: processed/embeddings.npy
+Output: processed/embeddings_f16.npy, processed/embeddings_int8.npz,
+        processed/quantization_report.json
+"""
+
+import json
+import os
+
+import numpy as np
+
+# Paths
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROCESSED_DIR = os.path.join(os.path.dirname(BASE_DIR), "processed")
+
+# Format used by the pipeline and the backend ("float32", "float16" or "int8")
+EMBEDDING_FORMAT = os.environ.get("LINGO_EMBEDDING_FORMAT", "int8")
+
+EMBEDDING_FILES = {
+    "float32": "embeddings.npy",
+    "float16": "embeddings_f16.npy",
+    "int8": "embeddings_int8.npz",
+}
+
+# Neighbor list sizes to check recall at (the UI shows 9, similarities.json keeps 20)
+RECALL_K = (9, 20)
+# Cap on query rows for the report, so it stays cheap on large corpora
+MAX_REPORT_QUERIES = 2000
+
+
+def quantize_int8(embeddings):
+    """Symmetric per-vector int8 quantization. Returns (q, scale)."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    scale = np.abs(embeddings).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    q = np.clip(np.rint(embeddings / scale[:, None]), -127, 127).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+
+def save_embeddings(embeddings, fmt, processed_dir=PROCESSED_DIR):
+    """Write embeddings in the given format; returns the file path."""
+    path = os.path.join(processed_dir, EMBEDDING_FILES[fmt])
+    if fmt == "float32":
+        np.save(path, np.asarray(embeddings, dtype=np.float32))
+    elif fmt == "float16":
+        np.save(path, np.asarray(embeddings, dtype=np.float16))
+    elif fmt == "int8":
+        q, scale = quantize_int8(embeddings)
+        np.savez(path, q=q, scale=scale)
+    else:
+        raise ValueError(f"Unknown embedding format: {fmt}")
+    return path
+
+
+def load_embeddings(fmt=EMBEDDING_FORMAT, processed_dir=PROCESSED_DIR):
+    """
+    Load the stored vectors for cosine similarity.
+    int8 comes back without its scale, which cosine similarity does not need.
+    Falls back to float32 when the quantized file has not been written yet.
+    """
+    path = os.path.join(processed_dir, EMBEDDING_FILES[fmt])
+    if not os.path.exists(path):
+        fmt = "float32"
+        path = os.path.join(processed_dir, EMBEDDING_FILES[fmt])
+    if fmt == "int8":
+        with np.load(path) as data:
+            return data["q"]
+    return np.load(path)
+
+
+def normalize_rows(vectors):
+    """L2-normalize rows as float32 (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def top_k_indices(sims, k):
+    """Indices of the k largest entries per row (unordered)."""
+    return np.argpartition(-sims, k - 1, axis=1)[:, :k]
+
+
+def compare_to_float32(reference, vectors, query_idx):
+    """Similarity error and top-k recall of vectors against float32 reference."""
+    ref = normalize_rows(reference)
+    test = normalize_rows(vectors)
+
+    ref_sims = ref[query_idx] @ ref.T
+    test_sims = test[query_idx] @ test.T
+    # Mask the query itself out of the neighbor lists
+    ref_sims[np.arange(len(query_idx)), query_idx] = -np.inf
+    test_sims[np.arange(len(query_idx)), query_idx] = -np.inf
+
+    finite = np.isfinite(ref_sims)
+    error = np.abs(ref_sims[finite] - test_sims[finite])
+
+    recall = {}
+    for k in RECALL_K:
+        if k >= ref.shape[0]:
+            continue
+        ref_top = top_k_indices(ref_sims, k)
+        test_top = top_k_indices(test_sims, k)
+        hits = sum(len(set(a) & set(b)) for a, b in zip(ref_top, test_top))
+        recall[f"recall@{k}"] = round(hits / (k * len(query_idx)), 4)
+
+    return {
+        "mean_abs_error": float(error.mean()) if error.size else 0.0,
+        "max_abs_error": float(error.max()) if error.size else 0.0,
+        **recall,
+    }
+
+
+def main(embeddings=None):
+    if embeddings is None:
+        print("Loading embeddings...")
+        embeddings = np.load(os.path.join(PROCESSED_DIR, EMBEDDING_FILES["float32"]))
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    print(f"Embeddings shape: {embeddings.shape}")
+
+    rng = np.random.default_rng(12230006)
+    n = len(embeddings)
+    query_idx = np.arange(n) if n <= MAX_REPORT_QUERIES else np.sort(rng.choice(n, MAX_REPORT_QUERIES, replace=False))
+
+    report = {
+        "num_embeddings": int(n),
+        "dim": int(embeddings.shape[1]),
+        "num_queries": int(len(query_idx)),
+        "formats": {
+            "float32": {"bytes": int(embeddings.nbytes)},
+        },
+    }
+
+    for fmt in ("float16", "int8"):
+        path = save_embeddings(embeddings, fmt)
+        print(f"Saved {fmt} embeddings to {path}")
+
+        stored = load_embeddings(fmt)
+        stats = compare_to_float32(embeddings, stored, query_idx)
+        stats["bytes"] = int(stored.nbytes + (4 * n if fmt == "int8" else 0))
+        stats["file_bytes"] = os.path.getsize(path)
+        stats["compression"] = round(embeddings.nbytes / stats["bytes"], 2)
+        report["formats"][fmt] = stats
+
+    out_path = os.path.join(PROCESSED_DIR, "quantization_report.json")
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print("\n" + "=" * 50)
+    print(f"{'format':<10}{'size':>8}{'mean err':>11}{'max err':>10}" + "".join(f"{'R@' + str(k):>8}" for k in RECALL_K))
+    for fmt, stats in report["formats"].items():
+        row = f"{fmt:<10}{stats['bytes'] / 1e6:>7.1f}M"
+        if fmt == "float32":
+            row += f"{'-':>11}{'-':>10}" + "".join(f"{'1.0':>8}" for _ in RECALL_K)
+        else:
+            row += f"{stats['mean_abs_error']:>11.5f}{stats['max_abs_error']:>10.5f}"
+            row += "".join(f"{stats.get(f'recall@{k}', float('nan')):>8.3f}" for k in RECALL_K)
+        print(row)
+    print("=" * 50)
+    print(f"Saved report to {out_path}")
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
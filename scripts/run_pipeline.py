@@ -0,0 +1,386 @@
+"""
+Run the whole data pipeline as a DAG of stages.
+Each stage declares the files it reads and writes; a stage is skipped when its
+inputs (and its script) are unchanged since the last successful run and its
+outputs still exist. Independent stages (similarities and t-SNE) run concurrently,
+and data loaded or produced by one stage is handed to the next in-process.
+
+Memory per stage: rss_delta_mb is the resident memory a stage left behind and
+peak_growth_mb how far it raised the process high-water mark. Both are process-wide,
+so concurrent stages blur them. With --isolate every stage runs in its own process
+(loading its inputs from disk) and peak_rss_mb is that stage's own peak.
+
+Usage: python scripts/run_pipeline.py [--force] [--only STAGE ...] [--jobs N] [--isolate]
+Output: processed/pipeline_state.json, processed/pipeline_report.json
+"""
+
+import argparse
+import importlib
+import multiprocessing
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Paths
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+PROCESSED_DIR = os.path.join(PROJECT_ROOT, "processed")
+STATE_PATH = os.path.join(PROCESSED_DIR, "pipeline_state.json")
+REPORT_PATH = os.path.join(PROCESSED_DIR, "pipeline_report.json")
+
+# Stage table, in README order.
+# - module: script in scripts/ whose main() runs the stage
+# - inputs/outputs: paths relative to the project root (directories allowed)
+# - uses: shared objects passed to main() as keyword arguments
+# - provides: name under which main()'s return value is shared with later stages
+STAGES = [
+    {
+        "name": "process_tasks",
+        "module": "process_tasks",
+        "inputs": ["data/tasks", "natural-instructions-master/tasks"],
+        "outputs": ["processed/tasks_basic.json"],
+        "uses": [],
+        "provides": "tasks",
+    },
+    {
+        "name": "embeddings",
+        "module": "generate_embeddings",
+        "inputs": ["processed/tasks_basic.json"],
+        "outputs": ["processed/embeddings.npy"],
+        "uses": ["tasks"],
+        "provides": "embeddings",
+    },
+    {
+        "name": "quantize",
+        "module": "quantize_embeddings",
+        "inputs": ["processed/embeddings.npy"],
+        "outputs": ["processed/embeddings_f16.npy", "processed/embeddings_int8.npz", "processed/quantization_report.json"],
+        "uses": ["embeddings"],
+        "provides": None,
+    },
+    {
+        "name": "similarities",
+        "module": "compute_similarities",
+        "inputs": ["processed/tasks_basic.json", "processed/embeddings.npy",
+                   "processed/embeddings_f16.npy", "processed/embeddings_int8.npz"],
+        "outputs": ["processed/similarities.json", "processed/neighbor_graph"],
+        "uses": ["tasks"],
+        "provides": "similarities",
+    },
+    {
+        "name": "tsne",
+        "module": "comute_tsne",
+        "inputs": ["processed/embeddings.npy"],
+        "outputs": ["processed/coords_3d.npy"],
+        "uses": ["embeddings"],
+        "provides": "coords_3d",
+    },
+    {
+        "name": "metrics",
+        "module": "compute_metrics",
+        "inputs": ["processed/tasks_basic.json", "processed/similarities.json"],
+        "outputs": ["processed/model_results.json", "processed/task_metrics.json"],
+        "uses": ["tasks", "similarities"],
+        "provides": None,
+    },
+    {
+        "name": "token_index",
+        "module": "build_token_index",
+        "inputs": ["processed/tasks_basic.json"],
+        "outputs": ["processed/token_index"],
+        "uses": ["tasks"],
+        "provides": None,
+    },
+    {
+        "name": "near_duplicates",
+        "module": "find_near_duplicates",
+        "inputs": ["processed/tasks_basic.json", "processed/token_index"],
+        "outputs": ["processed/near_duplicates"],
+        "uses": ["tasks"],
+        "provides": None,
+    },
+    {
+        "name": "group_views",
+        "module": "compute_group_views",
+        "inputs": ["processed/tasks_basic.json", "processed/embeddings.npy",
+                   "processed/embeddings_f16.npy", "processed/embeddings_int8.npz"],
+        "outputs": ["processed/group_views"],
+        "uses": ["tasks"],
+        "provides": None,
+    },
+    {
+        "name": "final_data",
+        "module": "create_final_data",
+        "inputs": ["processed/tasks_basic.json", "processed/coords_3d.npy"],
+        "outputs": ["processed/final", "processed/categories.json", "processed/summary.json"],
+        "uses": ["tasks", "coords_3d"],
+        "provides": None,
+    },
+]
+
+
+def _load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# How to load a shared object from disk when no stage in this run produced it
+LOADERS = {
+    "tasks": lambda: _load_json("processed/tasks_basic.json"),
+    "embeddings": lambda: np.load("processed/embeddings.npy"),
+    "similarities": lambda: _load_json("processed/similarities.json"),
+    "coords_3d": lambda: np.load("processed/coords_3d.npy"),
+}
+
+
+class SharedData:
+    """Objects shared between stages; each is loaded from disk at most once."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def put(self, name, value):
+        with self._lock:
+            self._values[name] = value
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._values:
+                print(f"[pipeline] Loading shared '{name}' from disk")
+                self._values[name] = LOADERS[name]()
+            return self._values[name]
+
+
+def fingerprint(path):
+    """Cheap change detector: size + mtime for files, aggregated over directories."""
+    if os.path.isfile(path):
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+    if os.path.isdir(path):
+        count, size, mtime = 0, 0, 0
+        for entry in os.scandir(path):
+            if entry.is_file():
+                st = entry.stat()
+                count += 1
+                size += st.st_size
+                mtime = max(mtime, st.st_mtime_ns)
+        return [count, size, mtime]
+    return None
+
+
+def was_written(path, before, since_ns):
+    """True if path changed since the `before` fingerprint or was modified after since_ns."""
+    after = fingerprint(path)
+    return after != before or after[-1] >= since_ns
+
+
+def stage_signature(stage):
+    """Fingerprints of the stage's script and inputs, compared against the last run."""
+    script = os.path.join(BASE_DIR, stage["module"] + ".py")
+    sig = {"script": fingerprint(script)}
+    for path in stage["inputs"]:
+        sig[path] = fingerprint(path)
+    return sig
+
+
+def build_dependencies(stages):
+    """A stage depends on every stage that writes one of its inputs."""
+    producers = {}
+    for stage in stages:
+        for path in stage["outputs"]:
+            producers[path] = stage["name"]
+    deps = {}
+    for stage in stages:
+        deps[stage["name"]] = {producers[p] for p in stage["inputs"] if p in producers and producers[p] != stage["name"]}
+    return deps
+
+
+def peak_rss_mb():
+    """Process-wide peak resident memory in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def current_rss_mb():
+    """Current resident memory in MB (Linux only, None elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+
+def _diff(after, before):
+    return None if after is None or before is None else round(after - before, 1)
+
+
+def run_stage(stage, shared):
+    """
+    Import the stage module, call its main() with shared data and time it.
+    cpu_s covers the stage's own thread; the memory numbers are process-wide.
+    """
+    before = {p: fingerprint(p) for p in stage["outputs"]}
+    started_ns = time.time_ns()
+    rss_start, peak_start = current_rss_mb(), peak_rss_mb()
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    kwargs = {name: shared.get(name) for name in stage["uses"]} if shared is not None else {}
+    module = importlib.import_module(stage["module"])
+    value = module.main(**kwargs)
+    cpu = time.thread_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    if shared is not None and stage["provides"] and value is not None:
+        shared.put(stage["provides"], value)
+
+    # Stages report errors by printing and returning early, so check that every
+    # output was (re)written by this run rather than left over from an earlier one
+    missing = [p for p in stage["outputs"] if not os.path.exists(p)]
+    if missing:
+        raise RuntimeError(f"stage did not write {', '.join(missing)}")
+    stale = [p for p in stage["outputs"] if not was_written(p, before[p], started_ns)]
+    if stale:
+        raise RuntimeError(f"stage did not update {', '.join(stale)}")
+
+    return {
+        "wall_s": round(wall, 2),
+        "cpu_s": round(cpu, 2),
+        "rss_delta_mb": _diff(current_rss_mb(), rss_start),
+        "peak_growth_mb": _diff(peak_rss_mb(), peak_start),
+    }
+
+
+def _run_stage_in_child(stage):
+    """Worker-process entry point: run one stage without shared data."""
+    os.chdir(PROJECT_ROOT)
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    try:
+        stats = run_stage(stage, None)
+    except SystemExit as e:  # keep the pool usable and report it as a failure
+        raise RuntimeError(f"stage exited with {e.code!r}")
+    stats["peak_rss_mb"] = peak_rss_mb()
+    return stats
+
+
+def run_stage_isolated(stage):
+    """Run one stage in a fresh process so its peak memory is its own."""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(_run_stage_in_child, stage).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the LINGO data pipeline")
+    parser.add_argument("--force", action="store_true", help="rerun every selected stage")
+    parser.add_argument("--only", nargs="+", metavar="STAGE", help="run only these stages")
+    parser.add_argument("--jobs", type=int, default=2, help="max stages running at once")
+    parser.add_argument("--isolate", action="store_true",
+                        help="run each stage in its own process (separate memory numbers, no shared data)")
+    args = parser.parse_args()
+
+    # Stage scripts use paths relative to the project root
+    os.chdir(PROJECT_ROOT)
+    sys.path.insert(0, BASE_DIR)
+    os.makedirs(PROCESSED_DIR, exist_ok=True)
+
+    names = [s["name"] for s in STAGES]
+    if args.only:
+        unknown = set(args.only) - set(names)
+        if unknown:
+            parser.error(f"unknown stage(s): {', '.join(sorted(unknown))} (choose from {', '.join(names)})")
+    selected = [s for s in STAGES if not args.only or s["name"] in args.only]
+    by_name = {s["name"]: s for s in selected}
+    deps = {name: d & set(by_name) for name, d in build_dependencies(selected).items()}
+
+    state = _load_json(STATE_PATH) if os.path.exists(STATE_PATH) else {}
+    shared = SharedData()
+    report = {}
+    pending = dict(deps)
+    running = {}
+
+    def ready():
+        return [n for n, d in pending.items() if all(report.get(x, {}).get("status") in ("ok", "cached") for x in d)]
+
+    def blocked():
+        return [n for n, d in pending.items() if any(report.get(x, {}).get("status") in ("failed", "blocked") for x in d)]
+
+    pipeline_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        while pending or running:
+            for name in blocked():
+                del pending[name]
+                report[name] = {"status": "blocked"}
+                print(f"[pipeline] {name}: skipped, an upstream stage failed")
+
+            for name in ready():
+                del pending[name]
+                stage = by_name[name]
+                sig = stage_signature(stage)
+                outputs_exist = all(os.path.exists(p) for p in stage["outputs"])
+                if not args.force and outputs_exist and state.get(name) == sig:
+                    report[name] = {"status": "cached"}
+                    print(f"[pipeline] {name}: up to date")
+                    continue
+                print(f"[pipeline] {name}: running")
+                if args.isolate:
+                    running[executor.submit(run_stage_isolated, stage)] = (name, sig)
+                else:
+                    running[executor.submit(run_stage, stage, shared)] = (name, sig)
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, sig = running.pop(future)
+                try:
+                    report[name] = dict(status="ok", **future.result())
+                    state[name] = sig
+                    print(f"[pipeline] {name}: done in {report[name]['wall_s']}s")
+                except BaseException as e:  # stage scripts may sys.exit() on missing deps
+                    report[name] = {"status": "failed", "error": repr(e)}
+                    state.pop(name, None)
+                    print(f"[pipeline] {name}: FAILED ({e!r})")
+
+            with open(STATE_PATH, "w") as f:
+                json.dump(state, f, indent=2)
+
+    total = time.perf_counter() - pipeline_start
+    with open(REPORT_PATH, "w") as f:
+        json.dump({"total_wall_s": round(total, 2), "stages": report}, f, indent=2)
+
+    print("\n" + "=" * 62)
+    peak_key, peak_label = ("peak_rss_mb", "peak MB") if args.isolate else ("peak_growth_mb", "peak+ MB")
+    print(f"{'stage':<16}{'status':<10}{'wall s':>8}{'cpu s':>8}{'rss+ MB':>10}{peak_label:>10}")
+    print("-" * 62)
+    for name in names:
+        if name not in report:
+            continue
+        r = report[name]
+        print(f"{name:<16}{r['status']:<10}{r.get('wall_s', ''):>8}{r.get('cpu_s', ''):>8}"
+              f"{str(r.get('rss_delta_mb', '')):>10}{str(r.get(peak_key, '')):>10}")
+    print("=" * 62)
+    print(f"Total: {total:.1f}s  (report: {os.path.relpath(REPORT_PATH, PROJECT_ROOT)})")
+
+    if any(r["status"] in ("failed", "blocked") for r in report.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Opt-in phase tracing for the pipeline scripts.
+With LINGO_TRACE=1, each `with tracer.phase("name"):` block records wall time,
+CPU time of the calling thread and the tracemalloc peak reached inside it, and
+save() writes them to processed/traces/<stage>.json. With tracing off, phase() is
+a no-op context and tracemalloc is never started.
+
+tracemalloc runs only while some phase is open (it is stopped again when the last
+one closes, unless it was already running), so later pipeline stages are not slowed
+down. Its peak is process-wide: when run_pipeline.py runs stages concurrently, their
+phases reset and share one peak, so peak_mb/delta_mb are only reliable with --jobs 1.
+
+Usage:
+    tracer = PhaseTracer("compute_similarities")
+    with tracer.phase("load"):
+        ...
+    tracer.save()
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# Paths
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRACE_DIR = os.path.join(os.path.dirname(BASE_DIR), "processed", "traces")
+
+TRACE_ENABLED = os.environ.get("LINGO_TRACE", "") not in ("", "0")
+
+_NO_TRACE = contextlib.nullcontext()
+
+# Open phases across all tracers; tracemalloc runs while this is non-zero
+_open_phases = 0
+_owns_tracemalloc = False
+_tracing_lock = threading.Lock()
+
+
+def _start_tracing():
+    global _open_phases, _owns_tracemalloc
+    with _tracing_lock:
+        if _open_phases == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _owns_tracemalloc = True
+        _open_phases += 1
+
+
+def _stop_tracing():
+    global _open_phases, _owns_tracemalloc
+    with _tracing_lock:
+        _open_phases -= 1
+        if _open_phases == 0 and _owns_tracemalloc:
+            tracemalloc.stop()
+            _owns_tracemalloc = False
+
+
+class PhaseTracer:
+    """Collects per-phase wall time, CPU time and peak traced memory for one stage."""
+
+    def __init__(self, stage, enabled=None):
+        self.stage = stage
+        self.enabled = TRACE_ENABLED if enabled is None else enabled
+        self.phases = []
+
+    def phase(self, name):
+        if not self.enabled:
+            return _NO_TRACE
+        return self._traced(name)
+
+    @contextlib.contextmanager
+    def _traced(self, name):
+        _start_tracing()
+        current_start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            current, peak = tracemalloc.get_traced_memory()
+            _stop_tracing()
+            self.phases.append({
+                "phase": name,
+                "wall_s": round(wall, 3),
+                "cpu_s": round(cpu, 3),
+                "peak_mb": round(peak / 1e6, 1),
+                "delta_mb": round((current - current_start) / 1e6, 1),
+            })
+            print(f"[trace] {self.stage}/{name}: {wall:.2f}s wall, {cpu:.2f}s cpu, peak {peak / 1e6:.1f} MB")
+
+    def save(self):
+        """Write the recorded phases (no-op when tracing is off)."""
+        if not self.enabled:
+            return None
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        path = os.path.join(TRACE_DIR, f"{self.stage}.json")
+        with open(path, "w") as f:
+            json.dump({"stage": self.stage, "phases": self.phases}, f, indent=2)
+        print(f"[trace] Saved {path}")
+        return path
@@ -0,0 +1,98 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+import build_token_index  # noqa: E402
+import find_near_duplicates  # noqa: E402
+
+COPIED = {
+    "input": "Passage: The committee approved the new budget after a long debate on Tuesday evening. "
+             "Question: When was the budget approved?",
+    "output": "Tuesday evening",
+    "explanation": "The passage states the committee approved the budget on Tuesday evening, "
+                   "so this answer is correct and grounded in the text.",
+}
+
+
+def make_tasks():
+    filler = [
+        {"input": f"Passage: Item {i} describes a river crossing a valley near town number {i}. "
+                  f"Question: What does item {i} describe?", "output": [f"river {i}"]}
+        for i in range(6)
+    ]
+    return [
+        {
+            "id": 0,
+            "definition": "Answer the question using the passage.",
+            "positive_examples": [COPIED],
+            "negative_examples": [],
+            # First instance copies the positive example word for word
+            "instances": [{"input": COPIED["input"], "output": [COPIED["output"]]}] + filler,
+        },
+        {
+            "id": 1,
+            "definition": "Classify the sentiment of the review.",
+            "positive_examples": [{"input": "Review: A wonderful film with great acting and music.",
+                                   "output": "positive", "explanation": "Praises the film."}],
+            "negative_examples": [],
+            "instances": [{"input": f"Review: Scene {i} was dull, slow and far too long overall.",
+                           "output": ["negative"]} for i in range(4)],
+        },
+    ]
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    index_dir, output_dir = tmp_path / "token_index", tmp_path / "near_duplicates"
+    monkeypatch.setattr(build_token_index, "INDEX_DIR", str(index_dir))
+    monkeypatch.setattr(find_near_duplicates, "INDEX_DIR", str(index_dir))
+    monkeypatch.setattr(find_near_duplicates, "OUTPUT_DIR", str(output_dir))
+    return index_dir, output_dir
+
+
+def test_copied_positive_example_is_flagged(dirs):
+    _, output_dir = dirs
+    tasks = make_tasks()
+    build_token_index.main(tasks)
+    find_near_duplicates.main(tasks)
+
+    with open(output_dir / "leakage.json") as f:
+        leakage = {row["task_id"]: row for row in json.load(f)}
+    assert leakage[0]["num_leaked"] == 1
+    assert leakage[0]["max_similarity"] == 1.0
+    assert leakage[1]["num_leaked"] == 0
+
+
+RUN_BOTH = """
+import json, sys
+sys.path.insert(0, {scripts!r})
+import build_token_index, find_near_duplicates
+build_token_index.INDEX_DIR = find_near_duplicates.INDEX_DIR = {index!r}
+find_near_duplicates.OUTPUT_DIR = {output!r}
+tasks = json.load(open({tasks!r}))
+build_token_index.main(tasks)
+find_near_duplicates.main(tasks)
+"""
+
+
+def test_results_do_not_depend_on_hash_seed(tmp_path):
+    tasks_path = tmp_path / "tasks.json"
+    tasks_path.write_text(json.dumps(make_tasks()))
+
+    outputs = []
+    for seed in ("1", "2"):
+        run_dir = tmp_path / f"seed{seed}"
+        code = RUN_BOTH.format(scripts=SCRIPTS_DIR, index=str(run_dir / "token_index"),
+                               output=str(run_dir / "near_duplicates"), tasks=str(tasks_path))
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True)
+        outputs.append(((run_dir / "near_duplicates" / "leakage.json").read_text(),
+                        (run_dir / "near_duplicates" / "clusters.json").read_text(),
+                        (run_dir / "token_index" / "vocab.json").read_text()))
+    assert outputs[0] == outputs[1]